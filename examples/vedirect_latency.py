@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# On-device record latency for VEDirectAsyncio (MicroPython, ESP32).
+#
+# Wire the TX pin of the sending UART to the RX pin of the receiving UART.
+# Records are written on one UART and read back through VEDirectAsyncio on
+# the other; latency is measured from the moment the last byte (the checksum)
+# has left the transmitter to the moment the record callback runs.
+
+import asyncio
+import time
+from machine import UART
+
+from vedirect.vedirect_asyncio import VEDirectAsyncio
+
+TX_UART, TX_PIN = 2, 17   # sender
+RX_UART, RX_PIN = 1, 18   # VEDirectAsyncio
+SAMPLES = 50
+
+# An MPPT record, as produced by tests/vedirect_device_emulator_ESP.py
+FIELDS = (("V", "12800"), ("VPV", "3350"), ("PPV", "130"), ("I", "15000"), ("IL", "1500"),
+          ("LOAD", "ON"), ("H19", "456"), ("H20", "45"), ("H21", "300"), ("H22", "45"),
+          ("H23", "350"), ("ERR", "0"), ("CS", "5"), ("FW", "1.19"), ("PID", "0xA042"),
+          ("SER#", "HQ141112345"), ("HSDS", "0"), ("MPPT", "2"))
+
+
+def make_record():
+    body = b"".join(b"\r\n" + k.encode() + b"\t" + v.encode() for k, v in FIELDS) + b"\r\nChecksum\t"
+    return body + bytes(((256 - sum(body) % 256) % 256,))
+
+
+async def main():
+    record = make_record()
+    received = asyncio.Event()
+    arrived = [0]
+
+    def on_record(rec):
+        arrived[0] = time.ticks_us()
+        received.set()
+
+    tx = UART(TX_UART, baudrate=19200, tx=TX_PIN)
+    VEDirectAsyncio(uartId=RX_UART, rx=RX_PIN, tx=RX_PIN + 1, callback=on_record)
+    await asyncio.sleep_ms(100)
+    latencies = []
+    for _ in range(SAMPLES):
+        received.clear()
+        tx.write(record)
+        tx.flush()  # returns once the checksum byte is on the wire
+        sent = time.ticks_us()
+        await received.wait()
+        latencies.append(time.ticks_diff(arrived[0], sent))
+        await asyncio.sleep_ms(200)
+    latencies.sort()
+    print("record latency us: min {} median {} max {}".format(
+        latencies[0], latencies[len(latencies) // 2], latencies[-1]))
+
+
+asyncio.run(main())
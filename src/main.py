@@ -7,12 +7,8 @@ from vedirect.vedirect_asyncio import VEDirectAsyncio
 #machine.freq(240000000) # Juice things up a bit
 
 async def loop(ve):
-    e = ve.getEvent()
-    while True:
-        await e.wait()
-        e.clear()
-        record = ve.getRecord()
-        print("event:",record)
+    async for record in ve.records():
+        print("record:",record)
 
 def printRecord(record):
     print("callback:",record)
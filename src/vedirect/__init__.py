@@ -1,2 +1,7 @@
 from .vedirect import VEDirect
 from .vedirect_asyncio import VEDirectAsyncio
+from .vedirect_record import VEDirectRecord
+from .vedirect_hex_client import VEDirectHexClient
+from .vedirect_hub import VEDirectHub
+from .vedirect_tcp import VEDirectTCPPool
+from .vedirect_rolling import VEDirectRollingStats
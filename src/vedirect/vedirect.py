@@ -11,32 +11,57 @@ import sys
 import logging
 from micropython import const
 
-MICROPYTHON = True
 log = logging.getLogger(__name__)
 from ESPLogRecord import ESPLogRecord
 log.record = ESPLogRecord()
 
-from machine import UART
+try:
+    from machine import UART
+    MICROPYTHON = True
+except ImportError:
+    import serial
+    MICROPYTHON = False
 
-from vedirect.vedirect_base import VEDirectBase
+from vedirect.vedirect_base import VEDirectBase, ticks_ms, ticks_add, ticks_diff
 
 class VEDirect(VEDirectBase):
 
-    def __init__(self, serialport, timeout=60):
+    # Bytes taken from the port per read
+    RX_CHUNK = const(512)
+    # Records held for read() callers; the oldest is dropped beyond this
+    RECORD_QUEUE = const(16)
+
+    def __init__(self, serialport, timeout=60, compact=False):
         """Constructor for a Victron VEDirect serial communication session.
 
         Params:
             serialport (int): The number of the UART to open OR
+                (str): "tcp://host:port" of a ser2net / Wi-Fi serial bridge OR
+                (str): the serial device to open with pyserial OR
                 an already opened interface that adheres the serial interface
             timeout (float): Read timeout value (seconds)
+            compact (bool): Return VEDirectRecord objects instead of dicts
         """
-        super().__init__()
+        super().__init__(compact)
+        self._buff_records = []
+        self._rxbuf = bytearray(self.RX_CHUNK)  # Reused for every read
+        self._rxmv = memoryview(self._rxbuf)
+        self._poller = None
         log.debug("serialport is %s", type(serialport))
-        if isinstance(serialport, int):
+        if isinstance(serialport, str) and serialport.startswith("tcp://"):
+            from vedirect.vedirect_tcp import TCPPort, parse_url
+            log.debug("VEDirect init connecting to %s", serialport)
+            self.serialport = serialport
+            self.ser = TCPPort(*parse_url(serialport), timeout=timeout)
+        elif isinstance(serialport, int) and MICROPYTHON:
             log.debug(const("VEDirect init opening UART %d"), serialport)
             self.serialport = serialport
             self.ser = UART(int(serialport), 19200, timeout=timeout)  # E.g. for fipy 0,1, or 2
             #self.ser.init(baudrate=19200, timeout_chars=10)
+        elif isinstance(serialport, str) and not MICROPYTHON:
+            log.debug("VEDirect init opening serial port %s", serialport)
+            self.serialport = serialport
+            self.ser = serial.Serial(serialport, 19200, timeout=timeout)
         else:
             log.debug(
                 const("VEDirect init using passed in serial port: %s"),str(serialport)
@@ -44,48 +69,111 @@ class VEDirect(VEDirectBase):
             self.serialport = str(serialport)
             self.ser = serialport
 
+    def write(self, data):
+        """Send bytes to the device, e.g. HEX protocol frames"""
+        return self.ser.write(data)
+
+    def _available(self):
+        """Bytes waiting on the port, or -1 if the port can't tell"""
+        any = getattr(self.ser, "any", None)  # MicroPython UART
+        if any is not None:
+            return any()
+        waiting = getattr(self.ser, "in_waiting", None)  # pyserial
+        if waiting is not None:
+            return waiting
+        return -1
+
+    def _read_chunk(self, n):
+        """Read up to n bytes in one call, into the reusable buffer where the port allows"""
+        n = min(n, self.RX_CHUNK)
+        readinto = getattr(self.ser, "readinto", None)
+        if readinto is not None:
+            got = readinto(self._rxmv[:n])
+            return self._rxmv[:got or 0]
+        return self.ser.read(n) or b""
+
+    def _queue(self, chunk):
+        """Parse a chunk, queueing every record it completes"""
+        for record in self.feed(chunk):
+            if len(self._buff_records) >= self.RECORD_QUEUE:
+                self._buff_records.pop(0)
+            self._buff_records.append(record if self.compact else self.typecast(record))
+
     def read(self):
         """
-        Check for input buffer, process if present, return record if complete. 
+        Take whatever input is waiting, without blocking, and return the oldest
+        complete record, or None.
         """
-        if hasattr(self.ser, '__any__'):
-            input_buf_len = self.ser.any()
-        else:
-            input_buf_len = -1
-        log.debug("Input buffer %d chars",input_buf_len)
+        input_buf_len = self._available()
         if input_buf_len:
-            input_buf = self.ser.read(input_buf_len)
-            log.debug("Input: %d bytes read",len(input_buf))
-            for byte in input_buf:
-                record = self._input(byte.to_bytes(1, sys.byteorder))
-                if record is not None:
-                    record = self.typecast(record)
-                    self._buff_records.append(record)
-        try:
-            log.debug("Returning records")
-            return self._buff_records.pop()
-        except IndexError:
-            return None
+            self._queue(self._read_chunk(input_buf_len if input_buf_len > 0 else self.RX_CHUNK))
+        if self._buff_records:
+            return self._buff_records.pop(0)
+        return None
+
+    def _flush(self):
+        """Throw away queued records and whatever input is waiting"""
+        self._buff_records = []
+        reset = getattr(self.ser, "reset_input_buffer", None) or getattr(self.ser, "flushInput", None)
+        if reset is not None:
+            reset()
+            return
+        # Only what is there now; a chattering port must not keep us here
+        waiting = self._available()
+        while waiting > 0:
+            n = len(self._read_chunk(waiting))
+            if not n:
+                break
+            waiting -= n
+
+    def _read_waiting(self, wait_ms):
+        """Read what is waiting or, with nothing there, wait for input for up to
+        wait_ms (None: the port's own timeout)
+        """
+        waiting = self._available()
+        if waiting > 0:
+            return self._read_chunk(waiting)
+        if wait_ms is not None:
+            wait = getattr(self.ser, "wait", None)  # TCPPort
+            if wait is not None:
+                if not wait(wait_ms):
+                    return b""
+                return self._read_chunk(self.RX_CHUNK)
+            if MICROPYTHON:
+                if self._poller is None:
+                    import select
+                    self._poller = select.poll()
+                    self._poller.register(self.ser, select.POLLIN)
+                if not self._poller.poll(wait_ms):
+                    return b""
+                waiting = self._available()
+                return self._read_chunk(waiting if waiting > 0 else 1)
+            if hasattr(self.ser, "timeout"):
+                self.ser.timeout = wait_ms / 1000
+        return self._read_chunk(1)
 
     def read_data_single(self, flush=True, timeout=None):
-        """Wait until we get a single complete record, then return it. Optional timeout in ms"""
-        timer = None
-        if flush and not MICROPYTHON:
-            self.ser.flushInput()
-        if timeout and MICROPYTHON and Timer:
-            timer = Timer.Chrono()
-            timer.start()
-        while True:
-            if timer and timer.read_ms() > timeout:
-                log.debug("Timed out")
-                return None
-            byte = self.ser.read(1)
-            if byte:
-                # log.debug("Read: {}".format(byte))
-                # got a byte (didn't time out)
-                record = self._input(byte)
-                if record is not None:
-                    return self.typecast(record)
+        """Wait until we get a single complete record, then return it.
+        With a timeout (ms), return None if no record completes by then, however
+        the input behaves: silent, trickling in, or garbage.
+        """
+        if flush:
+            self._flush()
+        deadline = None if timeout is None else ticks_add(ticks_ms(), timeout)
+        port_timeout = getattr(self.ser, "timeout", None)
+        try:
+            while not self._buff_records:
+                remaining = None
+                if deadline is not None:
+                    remaining = ticks_diff(deadline, ticks_ms())
+                    if remaining <= 0:
+                        log.debug("Timed out")
+                        return None
+                self._queue(self._read_waiting(remaining))
+        finally:
+            if deadline is not None and not MICROPYTHON and port_timeout is not None:
+                self.ser.timeout = port_timeout
+        return self._buff_records.pop(0)
 
 
 def main():
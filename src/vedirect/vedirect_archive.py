@@ -0,0 +1,177 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+
+    Parallel archive parsing
+
+    Splits a large capture file into chunks that each end on a block boundary
+    (just after a Checksum byte), replays the chunks in a process pool with
+    VEDirectReplay and hands the results back in file order. CPython only.
+
+    for record in parse_archive("fleet-2023.bin", workers=8):
+        ...
+
+    parse_archive(path, workers=None, chunk_size=CHUNK_SIZE, compact=False, offsets=False,
+                  handler=None, stats=None)
+        yields records (or (start, end) block spans with offsets=True) in file
+        order; workers=None uses every core, workers=1 runs in this process.
+        With a handler, handler(<iterator of a chunk's records>) runs in the
+        worker and parse_archive yields its return value, once per chunk
+
+    split_points(path, chunk_size)
+        returns the [(start, end), ...] chunks the file is cut into
+
+    A chunk boundary is moved on from its nominal position to the end of the
+    block that straddles it, so every block lies wholly within one chunk and
+    each chunk starts exactly where sequential replay would start its next
+    block. Only as many chunks are in flight as there are workers (twice
+    over), so memory stays bounded however large the archive.
+
+    Records come back from the workers as value tuples against a table of
+    key sequences, which is several times cheaper to unpickle than dicts,
+    but rebuilding them is still serial work in this process. For scaling
+    that stays linear with cores, reduce in the workers with a handler
+    (module-level, so it can be pickled) and return only its result.
+
+'''
+
+import logging
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+log = logging.getLogger(__name__)
+
+from vedirect.vedirect_record import RecordProfile, VEDirectRecord
+from vedirect.vedirect_replay import MARK, VEDirectReplay
+
+CHUNK_SIZE = 32 * 1024 * 1024
+
+
+def split_points(path, chunk_size=CHUNK_SIZE):
+    '''
+        Cut the capture into chunks of about chunk_size bytes, each ending on a block boundary
+    '''
+    chunks = []
+    with VEDirectReplay(path) as replay:
+        buf = replay.buf
+        size = len(buf)
+        start = 0
+        while start < size:
+            nominal = start + chunk_size
+            if nominal >= size:
+                chunks.append((start, size))
+                break
+            # The block straddling the nominal cut stays in this chunk
+            mark = buf.find(MARK, nominal - len(MARK) + 1)
+            if mark < 0 or mark + len(MARK) + 1 >= size:
+                chunks.append((start, size))
+                break
+            end = mark + len(MARK) + 1
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def _pack(records, compact):
+    '''
+        A chunk's records as (key sequences, their indexes, value tuples)
+    '''
+    seen = {}
+    table = []
+    index = []
+    values = []
+    for record in records:
+        if compact:
+            keys = record.profile.keys
+            row = record.values
+        else:
+            keys = tuple(record)
+            row = tuple(record.values())
+        i = seen.get(keys)
+        if i is None:
+            i = seen[keys] = len(table)
+            table.append(keys)
+        index.append(i)
+        values.append(row)
+    return table, index, values
+
+
+def _unpack(packed, compact):
+    table, index, values = packed
+    if compact:
+        profiles = [RecordProfile(keys) for keys in table]
+        for i, row in zip(index, values):
+            yield VEDirectRecord(profiles[i], row)
+    else:
+        for i, row in zip(index, values):
+            yield dict(zip(table[i], row))
+
+
+def _replay_chunk(path, start, end, compact, offsets, handler):
+    '''
+        Worker: replay one chunk, returning its results and counters
+    '''
+    with VEDirectReplay(path, compact) as replay:
+        if handler is not None:
+            result = handler(replay.records(start, end))
+        elif offsets:
+            result = array("q")
+            for span in replay.offsets(start, end):
+                result.extend(span)
+        else:
+            result = _pack(replay.records(start, end), compact)
+        return result, replay.stats()
+
+
+def _results(result, compact, offsets, handler):
+    if handler is not None:
+        yield result
+    elif offsets:
+        for i in range(0, len(result), 2):
+            yield result[i], result[i + 1]
+    else:
+        yield from _unpack(result, compact)
+
+
+def parse_archive(path, workers=None, chunk_size=CHUNK_SIZE, compact=False, offsets=False,
+                  handler=None, stats=None):
+    '''
+        Yield every record in the capture, in order, parsing chunks in parallel.
+        Pass a dict as stats to have the counters of all chunks added up into it.
+    '''
+    chunks = split_points(path, chunk_size)
+    if stats is None:
+        stats = {}
+
+    def add(chunk_stats):
+        for key, value in chunk_stats.items():
+            stats[key] = stats.get(key, 0) + value
+
+    if workers == 1 or len(chunks) <= 1:
+        with VEDirectReplay(path, compact) as replay:
+            for start, end in chunks:
+                if handler is not None:
+                    yield handler(replay.records(start, end))
+                elif offsets:
+                    yield from replay.offsets(start, end)
+                else:
+                    yield from replay.records(start, end)
+            add(replay.stats())
+        return
+    workers = workers or os.cpu_count() or 1
+    log.debug("Parsing %s in %d chunks with %d workers", path, len(chunks), workers)
+    with ProcessPoolExecutor(workers) as pool:
+        pending = []
+        chunks = iter(chunks)
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.append(pool.submit(_replay_chunk, path, chunk[0], chunk[1], compact, offsets, handler))
+            if not pending:
+                return
+            result, chunk_stats = pending.pop(0).result()
+            add(chunk_stats)
+            yield from _results(result, compact, offsets, handler)
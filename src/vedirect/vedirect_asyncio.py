@@ -14,15 +14,47 @@
     
     VEDirectAsyncio(uart=<pre-initialised UART object>, # This...
                     uartId=<ESP32 UART Id>, rx=<RX Pin Number, tx=<TX Pin number>, # or this!
-                    callback=<callback for record completion>) # Optional
+                    host=<ser2net / Wi-Fi bridge address>, port=<TCP port>, # or over the network
+                    callback=<callback for record completion>, # Optional, plain or async def
+                    compact=<True for typecast VEDirectRecord objects, not dicts>, # Optional
+                    queue=<records held for getRecord()>, # Optional, default 8
+                    policy=<what to do when full, see RecordQueue>, # Optional, default drop oldest
+                    callbackQueue=<records waiting for the callback>, # Optional, default 8
+                    executor=<where a plain callback runs, see CallbackDispatcher>) # Optional
                     
     getEvent()
         returns an asyncio.Event which can be waited on to be alerted for a record completion.
         Call Event.clear() when notified
 
     getRecord()
-        returns the completed record if called after Event completes and record available,
+        returns the oldest completed record if called after Event completes and record available,
         otherwise None
+
+    getQueue()
+        returns the RecordQueue, e.g. to await get() on it or read its stats()
+
+    records(queue=8, policy=drop oldest)
+        returns a new subscription with a queue of its own, to iterate with
+        async for record in ve.records(): every subscriber gets every record,
+        once, in order, without polling
+
+    write(data)
+        sends bytes to the device, e.g. HEX frames from VEDirectHexClient
+
+    health()
+        returns the TCP bridge's connection counters (see vedirect_tcp), or None for a UART
+
+    stats()
+        returns the link quality counters, plus "queue", "subscribers",
+        "callback" (calls, errors, latency from hand-off, dropped) and
+        "read_loop" (reads, and how many took longer than READ_BUDGET_MS to
+        come back round to the UART)
+
+    The callback never runs in the read loop: records are handed to a
+    CallbackDispatcher, whose task (or, on CPython, thread pool) makes the
+    calls, so a callback that publishes to MQTT or writes to flash can't
+    hold up draining the UART. If it falls behind, the oldest records
+    waiting for it are dropped.
         
     
 '''
@@ -32,29 +64,55 @@ import sys
 import logging
 import asyncio
 from micropython import const
-from collections import deque
 
 log = logging.getLogger(__name__)
 from ESPLogRecord import ESPLogRecord
 log.record = ESPLogRecord()
 
-from machine import UART
+try:
+    from machine import UART
+except ImportError:
+    UART = None # CPython: a TCP bridge, or a UART-like object passed in
 
-from vedirect.vedirect_base import VEDirectBase
+from vedirect.vedirect_base import VEDirectBase, ticks_ms, ticks_diff
+from vedirect.vedirect_dispatch import CallbackDispatcher
+from vedirect.vedirect_queue import RecordQueue, RecordSubscription
 
 class VEDirectAsyncio(VEDirectBase):
 
-    def __init__(self, uart=None, uartId=None, rx=None, tx=None, callback=None):
-        super().__init__()
+    # Bytes taken from the UART per read; a whole record is around 250
+    RX_CHUNK = const(256)
+    # UART receive buffer when we open the UART ourselves: several records' worth
+    RX_BUFFER = const(1024)
+    # Parsing a chunk for longer than this counts as a read loop delay: the UART's
+    # 128 byte hardware FIFO fills in 66 ms at 19200 baud
+    READ_BUDGET_MS = const(50)
+
+    def __init__(self, uart=None, uartId=None, rx=None, tx=None, callback=None, compact=False,
+                 host=None, port=None, queue=RecordQueue.CAPACITY, policy=RecordQueue.DROP_OLDEST,
+                 callbackQueue=RecordQueue.CAPACITY, executor=None):
+        super().__init__(compact)
 
         self._uart = uart
         self._uartId = uartId
         self._rx = rx
         self._tx = tx
-        self._callback = callback
+        self._callback = None
+        if callback is not None:
+            self._callback = CallbackDispatcher(callback, callbackQueue, executor=executor)
+        self.reads = 0
+        self.read_delays = 0
+        self.read_max_ms = 0
         self._recordReady = asyncio.Event()
-        self._recordQ = deque((),2,True) # Somewhere to put records, only 2 secs worth!
-        if (uart is not None) and (uartId == None):
+        self._recordQ = RecordQueue(queue, policy) # Somewhere to put records until they're collected
+        self._subscribers = []
+        self._link = None
+        if host is not None:
+            # Raw VE.Direct stream from a TCP bridge, reconnected as needed
+            from vedirect.vedirect_tcp import TCPLink
+            log.info("Using TCP bridge %s:%d", host, port)
+            self._link = TCPLink(host, port)
+        elif (uart is not None) and (uartId == None):
             # We have a previously opened UART to use...
             log.info("Using UART provided")
             self._uart.init(baudrate=19200) # We assume you've used the pins you want to
@@ -62,7 +120,7 @@ class VEDirectAsyncio(VEDirectBase):
             # We have to open our own UART
             log.info("Opening UART %s, rx %d tx %d", uartId, rx, tx)
             self._uart = UART(uartId)
-            self._uart.init(baudrate=19200, rx=rx, tx=tx) # We assume you've used the pins you want to
+            self._uart.init(baudrate=19200, rx=rx, tx=tx, rxbuf=self.RX_BUFFER) # We assume you've used the pins you want to
         else:
             # Get your act together guys, work with me here!
             log.error("You're having a laugh, I need either a UART or a set of UART parameters!")
@@ -72,13 +130,36 @@ class VEDirectAsyncio(VEDirectBase):
 
     def getRecord(self):
         '''
-            Return a record to the caller, if present, otherwise None
+            Return the oldest record to the caller, if present, otherwise None
+        '''
+        return self._recordQ.get_nowait()
+
+    def getQueue(self):
+        return self._recordQ
+
+    def records(self, queue=RecordQueue.CAPACITY, policy=RecordQueue.DROP_OLDEST):
+        '''
+            Subscribe to the record stream: async for record in ve.records()
         '''
-        try:
-            return self._recordQ.pop()
-        except IndexError:
-            return None
+        return RecordSubscription(self._subscribers, queue, policy)
+
+    def stats(self):
+        result = super().stats()
+        result["queue"] = self._recordQ.stats()
+        result["subscribers"] = [sub.stats() for sub in self._subscribers]
+        if self._callback is not None:
+            result["callback"] = self._callback.stats()
+        result["read_loop"] = {"reads": self.reads, "delays": self.read_delays, "max_ms": self.read_max_ms}
+        return result
     
+    def write(self, data):
+        '''
+            Send bytes to the device, e.g. HEX protocol frames
+        '''
+        if self._link is not None:
+            return self._link.write(data)
+        return self._uart.write(data)
+
     def getEvent(self):
         '''
             Return the "record arrived" Event for the caller to wait on
@@ -86,28 +167,53 @@ class VEDirectAsyncio(VEDirectBase):
         '''
         return self._recordReady
     
+    def health(self):
+        '''
+            Connection counters for a TCP bridge, otherwise None
+        '''
+        return None if self._link is None else self._link.health()
+
+    async def _parse(self, chunk):
+        for record in self.feed(chunk):
+            if not self._recordQ.put_nowait(record):
+                await self._recordQ.put(record) # Policy is BLOCK: hold the read loop until there's room
+            for sub in self._subscribers:
+                if not sub.queue.put_nowait(record):
+                    await sub.queue.put(record)
+            if self._callback is not None: # User wants a callback, made from its own task
+                self._callback.submit(record)
+            self._recordReady.set() # Tell the Event people
+
+    async def _timed(self, chunk):
+        start = ticks_ms()
+        await self._parse(chunk)
+        took = ticks_diff(ticks_ms(), start)
+        self.reads += 1
+        if took > self.read_max_ms:
+            self.read_max_ms = took
+        if took > self.READ_BUDGET_MS:
+            self.read_delays += 1
+
     async def _go(self):
         '''
-            Loops checking port for any input
+            Waits on the UART stream and parses whatever has arrived in one go.
+            The task only wakes when there is input, so a record is delivered
+            as soon as its checksum byte is in
         '''
+        if self._link is not None:
+            await self._link.run(self._timed)
+            return
+        reader = asyncio.StreamReader(self._uart)
+        buf = bytearray(self.RX_CHUNK) # One buffer, reused for every read
+        mv = memoryview(buf)
+        readinto = getattr(reader, "readinto", None) # Not on older MicroPython releases
         while True:
-            log.debug("readloop task")
-            while self._uart.any(): # Any data on the serial port??
-                log.debug("readloop task - data present")
-                byte = self._uart.read(1) # OK, read a byte
-                if byte:
-                    log.debug("Read: %s", byte)
-                    # got a byte (didn't time out)
-                    record = self._input(byte)
-                    if record is not None:
-                        self._recordQ.appendleft(record) # Let the IndexError exception happen
-                        if self._callback is not None: # User wants a callback
-                            self._callback(record)
-                        self._recordReady.set() # Tell the Event people
-            # Hang around for some more data to arrive
-            # 19200 baud, 10 bits/char (8, 1 parity, 1 stop) => 2000 chars/sec
-            # Records are sent 1/sec, maybe 250 chars/record => 125ms transmit per record
-            # Let's try 250msec, which means we shouldn't miss any
-            log.debug("readloop - wait")
-            await asyncio.sleep_ms(250)
-
+            if readinto is not None:
+                n = await readinto(buf)
+                chunk = mv[:n]
+            else:
+                chunk = await reader.read(self.RX_CHUNK)
+                n = len(chunk)
+            if not n:
+                continue
+            await self._timed(chunk)
@@ -26,11 +26,32 @@ import sys
 import logging
 from micropython import const
 
+from vedirect.vedirect_record import RecordProfile, VEDirectRecord
+from vedirect.vedirect_hex import decode_frame
+
 MICROPYTHON = True
 log = logging.getLogger(__name__)
 from ESPLogRecord import ESPLogRecord
 log.record = ESPLogRecord()
 
+try:
+    from time import ticks_ms, ticks_us, ticks_add, ticks_diff
+except ImportError:
+    from time import monotonic
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
+
+    def ticks_us():
+        return int(monotonic() * 1000000)
+
+    def ticks_add(ticks, delta):
+        return ticks + delta
+
+    def ticks_diff(end, start):
+        return end - start
+
+
 def int_base_guess(string_val):
     return int(string_val, 0)
 
@@ -279,15 +300,50 @@ class VEDirectBase:
         "MPPT": int_base_guess,
     }
 
+    # Decoding plans, keyed by PID: (keys as sent, ((key, converter), ...), RecordProfile)
+    plans = {}
+    PLANS_MAX = 16
+
+    @staticmethod
+    def compile_plan(pid, keys):
+        """Build and cache the decoding plan for a device's key sequence.
+        Unknown keys are dropped from the plan, and reported once here.
+        """
+        types = VEDirectBase.types
+        unknown = [key for key in keys if key not in types]
+        if unknown:
+            log.warning("Got unknown VE keys for PID %s: %s, skipping...", pid, unknown)
+        known = tuple(key for key in keys if key in types)
+        plan = (keys, tuple((key, types[key]) for key in known), RecordProfile(known))
+        if len(VEDirectBase.plans) >= VEDirectBase.PLANS_MAX:
+            VEDirectBase.plans.clear()
+        VEDirectBase.plans[pid] = plan
+        return plan
+
     @staticmethod
     def typecast(payload_dict):
-        new_dict = {}
-        for key, val in payload_dict.items():
-            try:
-                new_dict[key] = VEDirectBase.types[key](val)
-            except KeyError as exc:
-                log.warning("Got unknown VE key: {}, skipping...".format(key))
-        return new_dict
+        """Convert the string values of a record to their native types.
+        The plan compiled from the first record of a PID is reused for as
+        long as the device keeps sending the same keys.
+        """
+        pid = payload_dict.get("PID")
+        keys = tuple(payload_dict)
+        plan = VEDirectBase.plans.get(pid)
+        if plan is None or plan[0] != keys:
+            plan = VEDirectBase.compile_plan(pid, keys)
+        return {key: conv(payload_dict[key]) for key, conv in plan[1]}
+
+    @staticmethod
+    def typecast_compact(payload_dict):
+        """As typecast(), but returns a VEDirectRecord whose key metadata is
+        shared with every other record from the same device.
+        """
+        pid = payload_dict.get("PID")
+        keys = tuple(payload_dict)
+        plan = VEDirectBase.plans.get(pid)
+        if plan is None or plan[0] != keys:
+            plan = VEDirectBase.compile_plan(pid, keys)
+        return VEDirectRecord(plan[2], tuple(conv(payload_dict[key]) for key, conv in plan[1]))
 
     fmt = {
         "%": ["%", 10, 1],
@@ -301,104 +357,340 @@ class VEDirectBase:
         "W": ["W", 1, 0],
     }
 
-    def __init__(self):
+    # Field size limits from the VE.Direct protocol specification
+    KEY_MAX = 9
+    VALUE_MAX = 33
+
+    # Longest HEX frame accepted, in characters between ':' and the newline
+    HEX_MAX = 80
+    HEX_QUEUE = 8
+
+    # Canonical key strings, keyed by their raw bytes and shared by all parsers.
+    # A device only sends a couple of dozen keys; the cap stops line noise growing it.
+    interned = {}
+    INTERNED_MAX = 128
+
+    def __init__(self, compact=False):
         """
             Constructor for a Victron VEDirect communication parser FSM
 
+            compact (bool): deliver typecast VEDirectRecord objects instead of dicts
         """
 
         self.header1 = b"\n"
         self.header2 = b"\r"
         self.hexmarker = b":"
         self.delimiter = b"\t"
-        self.key = b""
-        self.value = b""
+        # Fields are accumulated in place, and only decoded once complete
+        self._key = bytearray(self.KEY_MAX)
+        self._keymv = memoryview(self._key)
+        self._keylen = 0
+        self._keystr = None
+        self._value = bytearray(self.VALUE_MAX)
+        self._valuemv = memoryview(self._value)
+        self._valuelen = 0
         self.bytes_sum = 0
         self.state = self.WAIT_HEADER1
         self.dict = {}
+        self._trace = None
+        self.compact = compact
+        # HEX frames are collected separately and decoded once complete
+        self._hex = bytearray(self.HEX_MAX)
+        self._hexmv = memoryview(self._hex)
+        self._hexlen = 0
+        self._resume = self.WAIT_HEADER1
+        self._hex_handler = None
+        self.hex_messages = []
+        # Resynchronisation: where the current field and block started, and
+        # whether the block is already known to be corrupt
+        self._field_sum = 0
+        self._field_len = 0
+        self._block_len = 0
+        self._bad = False
+        self._starts = []
+        self._first_key = None
+        self._cr = False
+        self._error_ticks = None
+        # Link quality counters
+        self.bytes_in = 0
+        self.records_in = 0
+        self.checksum_errors = 0
+        self.resyncs = 0
+        self.bytes_discarded = 0
+        self.resync_ms = 0
+        self.hex_frames = 0
+        self.hex_errors = 0
 
     (HEX, WAIT_HEADER1, IN_KEY, IN_VALUE, IN_CHECKSUM) = range(5)
 
-    def _input(self, byte):
-        """Accepts a new byte and tries to finish constructing a record.
-        When a record is complete, it will be returned as a dictionary
+    def stats(self):
+        """Return the link quality counters as a dictionary"""
+        return {
+            "bytes_in": self.bytes_in,
+            "records": self.records_in,
+            "checksum_errors": self.checksum_errors,
+            "resyncs": self.resyncs,
+            "bytes_discarded": self.bytes_discarded,
+            "resync_ms": self.resync_ms,
+            "hex_frames": self.hex_frames,
+            "hex_errors": self.hex_errors,
+        }
+
+    def set_trace(self, trace=None):
+        """Install a byte-level trace hook, or remove it with None.
+
+        The hook is called as trace(state, data) for every slice of input the
+        parser consumes, where state is the parser state the slice was read in.
+        Nothing is logged on the parsing path otherwise, so leave this unset
+        unless diagnosing a link.
         """
-        log.debug("State: {}, Input: {}".format(self.state, byte))
-        if byte == self.hexmarker and self.state != self.IN_CHECKSUM:
-            log.debug("Changing to HEX state")
-            self.state = self.HEX
-
-        if self.state is not self.HEX:
-            self.bytes_sum += ord(byte)
-            log.debug("CRC: %d", self.bytes_sum)
-            if byte == b"\r":
-                # Ignore these, they are optional. Do count towards CRC!
-                log.debug("Skipping carriage return")
-                return None
-
-        if self.state == self.WAIT_HEADER1:
-            if byte == self.header1:
-                log.debug("Found header1")
-                self.state = self.IN_KEY
-            return None
-        
-        elif self.state == self.IN_KEY:
-            if byte == self.delimiter:
-                log.debug("Found delimiter")
-                if self.key == b"Checksum":
-                    log.debug("Found Checksum")
-                    self.state = self.IN_CHECKSUM
-                else:
-                    self.state = self.IN_VALUE
+        self._trace = trace
+
+    def set_hex_handler(self, handler=None):
+        """Deliver decoded HEX frames to handler(HexMessage) as they complete.
+        Without a handler they are queued, up to HEX_QUEUE, for get_hex().
+        """
+        self._hex_handler = handler
+
+    def get_hex(self):
+        """Return the oldest queued HexMessage, or None"""
+        if self.hex_messages:
+            return self.hex_messages.pop(0)
+        return None
+
+    def feed(self, buf):
+        """Accepts a chunk of input (bytes, bytearray or memoryview) and
+        yields every record completed within it, as a dictionary.
+        Partial fields and records are carried over to the next call.
+        The chunk may be reused by the caller once the generator is exhausted.
+        """
+        if not isinstance(buf, bytes):
+            buf = bytes(buf)  # MicroPython's bytearray and memoryview have no find()
+        mv = memoryview(buf)
+        pos = 0
+        end = len(buf)
+        self.bytes_in += end
+        while pos < end:
+            state = self.state
+            if state == self.HEX:
+                # HEX frames run to the newline, and are not part of the text checksum
+                nxt = buf.find(self.header1, pos)
+                stop = end if nxt < 0 else nxt
+                if self._trace is not None:
+                    self._trace(state, mv[pos:stop + 1])
+                n = self._hexlen + stop - pos
+                if n <= self.HEX_MAX:
+                    self._hex[self._hexlen:n] = mv[pos:stop]
+                self._hexlen = n
+                if nxt < 0:
+                    return
+                pos = nxt + 1
+                self.state = self._resume
+                self._end_hex()
+                continue
+
+            if state == self.IN_CHECKSUM:
+                if self._trace is not None:
+                    self._trace(state, mv[pos:pos + 1])
+                self.bytes_sum = (self.bytes_sum + buf[pos]) & 0xFF
+                self._block_len += 1
+                pos += 1
+                record = self._end_record()
+                if record is not None:
+                    yield record
+                continue
+
+            # Keys end at the tab, values and inter-record noise at the newline,
+            # and any of them can be cut short by a HEX frame
+            if state == self.IN_KEY:
+                nxt = buf.find(self.delimiter, pos)
             else:
-                self.key += byte
-            return None
-        
-        elif self.state == self.IN_VALUE:
-            if byte == self.header1:
-                log.debug("Found header1, ending value read")
-                try:
-                    key = str(self.key.decode(self.encoding))
-                    value = str(self.value.decode(self.encoding))
-                    log.info("Adding entry %s:%s",key, value)
-                    self.dict[key] = value
-                except UnicodeError:
-                    log.warning(
-                        "Could not decode key {} and value {}".format(
-                            self.key, self.value
-                        )
-                    )
-                self.key = b""
-                self.value = b""
+                nxt = buf.find(self.header1, pos)
+            stop = end if nxt < 0 else nxt
+            hexpos = buf.find(self.hexmarker, pos, stop)
+            if hexpos >= 0:
+                stop = hexpos
+            if state == self.IN_KEY and buf.find(self.header1, pos, stop) >= 0:
+                # A newline inside a key: the field is broken, pick up at the next line
+                self._break_field()
+                continue
+
+            if self._trace is not None:
+                self._trace(state, mv[pos:stop + 1])
+            seg = mv[pos:stop]
+            self.bytes_sum = (self.bytes_sum + sum(seg)) & 0xFF
+            self._block_len += stop - pos
+            if state == self.IN_KEY:
+                n = self._keylen + stop - pos
+                if n > self.KEY_MAX:
+                    self._break_field()
+                    pos = stop
+                    continue
+                self._key[self._keylen:n] = seg
+                self._keylen = n
+            elif state == self.IN_VALUE:
+                n = self._valuelen + stop - pos
+                if n > self.VALUE_MAX:
+                    self._break_field()
+                    pos = stop
+                    continue
+                self._value[self._valuelen:n] = seg
+                self._valuelen = n
+            if hexpos >= 0:
+                # Divert the HEX frame, then carry on where the text left off
+                self._resume = state
+                self._hexlen = 0
+                self.state = self.HEX
+                pos = hexpos + 1
+                continue
+            if nxt < 0:
+                # Field continues in the next chunk
+                self._cr = buf[end - 1] == 13
+                return
+            if state != self.IN_KEY:
+                # A new field starts at this newline, or at the carriage return before it
+                cr = buf[nxt - 1] == 13 if nxt > 0 else self._cr
+                self._field_sum = (self.bytes_sum - 13) & 0xFF if cr else self.bytes_sum
+                self._field_len = self._block_len - 1 if cr else self._block_len
+            self.bytes_sum = (self.bytes_sum + buf[nxt]) & 0xFF
+            self._block_len += 1
+            pos = nxt + 1
+
+            if state == self.WAIT_HEADER1:
                 self.state = self.IN_KEY
+            elif state == self.IN_KEY:
+                self._end_key()
             else:
-                self.value += byte
-            return None
-        
-        elif self.state == self.IN_CHECKSUM:
-            log.debug("Checking checksum... Current %d, CRC %d",
-                    self.bytes_sum % 256, ord(byte))
-            self.key = b""
-            self.value = b""
-            self.state = self.WAIT_HEADER1
-            if self.bytes_sum % 256 == 0:
-                self.bytes_sum = 0
-                dict_copy = self.dict.copy()
-                self.dict = {}  # clear the holder - ready for a new record
-                log.info("Returning record")
-                return dict_copy
-            else:
-                # print('Malformed record')
-                log.error(
-                    "Malformed record, Remainder: {}".format(self.bytes_sum % 256)
-                )
-                self.bytes_sum = 0
-        
-        elif self.state == self.HEX:
-            log.warning("_input is in HEX state. Current byte: {}, current value: {}".format(byte, self.value))
-            self.bytes_sum = 0
-            if byte == self.header2:
-                self.state = self.WAIT_HEADER1
-        
+                self._add_field()
+                self._keylen = 0
+                self._valuelen = 0
+                self.state = self.IN_KEY
+
+    def _end_hex(self):
+        n = self._hexlen
+        try:
+            if n > self.HEX_MAX:
+                raise ValueError("HEX frame too long")
+            if n and self._hex[n - 1] == 13:
+                n -= 1
+            message = decode_frame(self._hexmv[:n])
+        except ValueError as exc:
+            self.hex_errors += 1
+            log.warning("Bad HEX frame: %s", exc)
+            return
+        self.hex_frames += 1
+        if self._hex_handler is not None:
+            self._hex_handler(message)
         else:
-            raise AssertionError()
+            if len(self.hex_messages) >= self.HEX_QUEUE:
+                self.hex_messages.pop(0)
+            self.hex_messages.append(message)
+
+    def _error(self):
+        if self._error_ticks is None:
+            self._error_ticks = ticks_ms()
+
+    def _reset_block(self):
+        self._keylen = 0
+        self._valuelen = 0
+        self.bytes_sum = 0
+        self._block_len = 0
+        self._bad = False
+        self._starts = []
+        self.dict = {}
+
+    def _break_field(self):
+        # Malformed or longer than the protocol allows: drop the field, mark the
+        # block as corrupt and carry on from the next line, which may start a new block
+        self._keylen = 0
+        self._valuelen = 0
+        self._bad = True
+        self._error()
+        self.state = self.WAIT_HEADER1
+
+    def _end_key(self):
+        raw = bytes(self._keymv[:self._keylen])
+        key = self.interned.get(raw)
+        if key is None:
+            try:
+                key = str(raw, self.encoding)
+            except UnicodeError:
+                self._break_field()
+                return
+            if len(self.interned) >= self.INTERNED_MAX:
+                self.interned.clear()
+            self.interned[raw] = key
+        if key == "Checksum":
+            self.state = self.IN_CHECKSUM
+            return
+        if key in self.dict:
+            # A key seen twice means a block end went missing: this field is
+            # really the first of the next block, so restart the block and its
+            # checksum here and salvage that block
+            self.resyncs += 1
+            self.bytes_discarded += self._field_len
+            self._block_len -= self._field_len
+            self.bytes_sum = (self.bytes_sum - self._field_sum) & 0xFF
+            self._bad = False
+            self._starts = []
+            self.dict = {}
+            self._error()
+        elif self._bad and len(self._starts) < 32 and key == (self._first_key or key):
+            # Past a break, any field with the usual first key may begin the next block
+            self._starts.append((self._field_sum, self._field_len, len(self.dict)))
+        self._keystr = key
+        self.state = self.IN_VALUE
+
+    def _add_field(self):
+        # Carriage returns are optional; they count towards the CRC only
+        n = self._valuelen
+        if n and self._value[n - 1] == 13:
+            n -= 1
+        try:
+            self.dict[self._keystr] = str(self._valuemv[:n], self.encoding)
+        except UnicodeError:
+            self._bad = True
+            self._error()
+
+    def _salvage(self):
+        # Find the block start, after the break, whose checksum comes out right
+        for field_sum, field_len, n in self._starts:
+            if self.bytes_sum == field_sum:
+                self.resyncs += 1
+                self.bytes_discarded += field_len
+                self.bytes_sum = 0
+                self._bad = False
+                self.dict = dict(list(self.dict.items())[n:])
+                return
+
+    def _end_record(self):
+        self.state = self.WAIT_HEADER1
+        if self._bad:
+            self._salvage()
+        if self.bytes_sum == 0 and not self._bad:
+            record = self.dict
+            self._reset_block()  # hand over the holder, start a new one for the next record
+            self.records_in += 1
+            if record:
+                self._first_key = next(iter(record))
+            if self._error_ticks is not None:
+                self.resync_ms += ticks_diff(ticks_ms(), self._error_ticks)
+                self._error_ticks = None
+            if self.compact:
+                return self.typecast_compact(record)
+            return record
+        log.error("Malformed record, Remainder: %d", self.bytes_sum)
+        self.checksum_errors += 1
+        self.bytes_discarded += self._block_len
+        self._error()
+        self._reset_block()
+        return None
+
+    def _input(self, byte):
+        """Accepts a new byte and tries to finish constructing a record.
+        When a record is complete, it will be returned as a dictionary.
+        Kept for callers that push single bytes; feed() is much cheaper.
+        """
+        for record in self.feed(byte):
+            return record
+        return None
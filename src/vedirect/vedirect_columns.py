@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+
+    VEDirectColumns
+
+    Columnar sink for typecast records: each field goes straight into its own
+    typed NumPy array, so a day (or a month) of 1 Hz data from several devices
+    ends up as a handful of arrays instead of millions of dicts. CPython, needs
+    numpy; Parquet export also needs pyarrow.
+
+    cols = VEDirectColumns(capacity=1024) # Arrays double whenever they fill up
+    cols.append(record, t=None) # A typecast dict or VEDirectRecord; t e.g. time.time()
+    cols.extend(records)
+
+    cols.column("V") # numpy masked array, masked where a record had no "V"
+    cols.unit("V") # "mV", from VEDirectBase.units
+    cols.save_npz(path), VEDirectColumns.load_npz(path)
+    cols.to_parquet(path) # Missing values become nulls, units go in the field metadata
+
+    Column dtypes follow VEDirectBase.types: integers as int64, strings
+    (PID, SER#, FW, Relay...) dictionary-encoded as int32 codes into a list
+    of the distinct values, which hardly ever change. Keys that aren't in
+    types are left out, as typecast does. A timestamp, if given, goes in the
+    float64 "time" column.
+
+'''
+
+import logging
+
+log = logging.getLogger(__name__)
+
+from vedirect.vedirect_base import VEDirectBase
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TIME = "time"
+
+
+def dtype_of(key):
+    '''
+        The NumPy dtype stored for a key's typecast values
+    '''
+    if key == TIME:
+        return numpy.float64
+    if VEDirectBase.types.get(key) is str:
+        return numpy.int32  # Codes into the column's categories
+    return numpy.int64
+
+
+class VEDirectColumns:
+
+    CAPACITY = 1024
+
+    def __init__(self, capacity=CAPACITY):
+        if numpy is None:
+            raise ImportError("VEDirectColumns needs numpy")
+        self.length = 0
+        self.capacity = capacity
+        self._data = {}
+        self._present = {}
+        self._categories = {}  # String columns: key -> ({value: code}, [values])
+
+    def __len__(self):
+        return self.length
+
+    def keys(self):
+        return list(self._data)
+
+    def _add_column(self, key):
+        self._data[key] = numpy.zeros(self.capacity, dtype_of(key))
+        self._present[key] = numpy.zeros(self.capacity, numpy.bool_)
+        if VEDirectBase.types.get(key) is str:
+            self._categories[key] = ({}, [])
+
+    def _code(self, key, value):
+        codes, values = self._categories[key]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def _grow(self):
+        # Chunk doubling: amortised O(1) per record, at most half the space unused
+        capacity = self.capacity * 2
+        for columns in (self._data, self._present):
+            for key, old in columns.items():
+                new = numpy.zeros(capacity, old.dtype)
+                new[:self.length] = old[:self.length]
+                columns[key] = new
+        self.capacity = capacity
+
+    def append(self, record, t=None):
+        '''
+            Add one typecast record, optionally with its timestamp
+        '''
+        if self.length == self.capacity:
+            self._grow()
+        i = self.length
+        data = self._data
+        present = self._present
+        types = VEDirectBase.types
+        categories = self._categories
+        for key, value in record.items():
+            column = data.get(key)
+            if column is None:
+                if key not in types:
+                    continue
+                self._add_column(key)
+                column = data[key]
+            if key in categories:
+                value = self._code(key, value)
+            column[i] = value
+            present[key][i] = True
+        if t is not None:
+            if TIME not in data:
+                self._add_column(TIME)
+            data[TIME][i] = t
+            present[TIME][i] = True
+        self.length = i + 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def column(self, key):
+        '''
+            A key's values as a masked array, masked where records didn't have the key
+        '''
+        n = self.length
+        data = self._data[key][:n]
+        if key in self._categories:
+            values = self._categories[key][1]
+            data = numpy.array(values or [""])[data]
+        return numpy.ma.MaskedArray(data, mask=~self._present[key][:n])
+
+    def unit(self, key):
+        return "s" if key == TIME else VEDirectBase.units.get(key, "")
+
+    def save_npz(self, path):
+        '''
+            Save as .npz: each column under its key, its presence mask under "<key>.mask"
+            and a string column's distinct values under "<key>.categories"
+        '''
+        n = self.length
+        arrays = {}
+        for key in self._data:
+            arrays[key] = self._data[key][:n]
+            arrays[key + ".mask"] = self._present[key][:n]
+        for key, (_, values) in self._categories.items():
+            arrays[key + ".categories"] = numpy.array(values, dtype=str)
+        numpy.savez(path, **arrays)
+
+    @classmethod
+    def load_npz(cls, path):
+        cols = cls.__new__(cls)
+        cols._data = {}
+        cols._present = {}
+        cols._categories = {}
+        with numpy.load(path) as npz:
+            for name in npz.files:
+                key, _, part = name.partition(".")
+                if part == "mask":
+                    cols._present[key] = npz[name]
+                elif part == "categories":
+                    values = npz[name].tolist()
+                    cols._categories[key] = ({value: code for code, value in enumerate(values)}, values)
+                else:
+                    cols._data[name] = npz[name]
+        cols.length = cols.capacity = len(next(iter(cols._data.values()), ()))
+        return cols
+
+    def to_parquet(self, path):
+        '''
+            Write a Parquet file; needs pyarrow
+        '''
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow")
+        n = self.length
+        fields = []
+        arrays = []
+        for key in self._data:
+            array = pyarrow.array(self._data[key][:n], mask=~self._present[key][:n])
+            if key in self._categories:
+                values = pyarrow.array(self._categories[key][1], pyarrow.string())
+                array = pyarrow.DictionaryArray.from_arrays(array, values)
+            fields.append(pyarrow.field(key, array.type, metadata={"unit": self.unit(key)}))
+            arrays.append(array)
+        pyarrow.parquet.write_table(pyarrow.Table.from_arrays(arrays, schema=pyarrow.schema(fields)), path)
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+
+    CallbackDispatcher
+
+    Runs a user callback off the read loop: the read loop hands each call
+    over through a bounded RecordQueue and carries on draining the UART,
+    while a task of its own makes the calls, one at a time and in order.
+
+    dispatch = CallbackDispatcher(callback, # Plain function or async def
+                                  queue=8, # Calls waiting to be made
+                                  policy=RecordQueue.DROP_OLDEST, # When they pile up
+                                  executor=None) # See below
+
+    submit(*args) -> False if refused (BLOCK and full)
+    await put(*args)
+    stats() -> {"calls", "errors", "latency_us_mean", "latency_us_max", "queue"}
+
+    A plain callback runs in an executor where the event loop has one
+    (CPython: executor=None means the loop's default thread pool, or pass
+    your own), so even one that blocks on a socket or a file leaves the loop
+    alone. On MicroPython, or with executor=False, it runs in the dispatch
+    task, which still keeps it out of the read loop. A callback that returns
+    a coroutine (async def) is awaited in the dispatch task. Latency runs
+    from hand-off to the callback returning, so it includes time queued.
+
+'''
+
+import logging
+import asyncio
+
+log = logging.getLogger(__name__)
+
+from vedirect.vedirect_base import ticks_us, ticks_diff
+from vedirect.vedirect_queue import RecordQueue
+
+
+class CallbackDispatcher:
+
+    def __init__(self, callback, queue=RecordQueue.CAPACITY, policy=RecordQueue.DROP_OLDEST, executor=None):
+        self._callback = callback
+        self._calls = RecordQueue(queue, policy)
+        self._executor = executor
+        self.calls = 0
+        self.errors = 0
+        self.latency_total = 0
+        self.latency_max = 0
+        self._run = asyncio.create_task(self._go())
+
+    def submit(self, *args):
+        '''
+            Hand a call over without waiting; False if refused under BLOCK
+        '''
+        return self._calls.put_nowait((ticks_us(), args))
+
+    async def put(self, *args):
+        '''
+            Hand a call over, waiting for room if the policy is BLOCK
+        '''
+        await self._calls.put((ticks_us(), args))
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "latency_us_mean": self.latency_total // self.calls if self.calls else 0,
+            "latency_us_max": self.latency_max,
+            "queue": self._calls.stats(),
+        }
+
+    def close(self):
+        self._run.cancel()
+
+    async def _call(self, args):
+        if self._executor is not False:
+            run_in_executor = getattr(asyncio.get_event_loop(), "run_in_executor", None) # Not on MicroPython
+            if run_in_executor is not None:
+                return await run_in_executor(self._executor, self._callback, *args)
+        return self._callback(*args)
+
+    async def _go(self):
+        while True:
+            handed, args = await self._calls.get()
+            try:
+                result = await self._call(args)
+                if hasattr(result, "send"): # A coroutine: async def callback
+                    await result
+            except Exception as e:
+                self.errors += 1
+                log.error("Callback failed: %s", e)
+            latency = ticks_diff(ticks_us(), handed)
+            self.calls += 1
+            self.latency_total += latency
+            if latency > self.latency_max:
+                self.latency_max = latency
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+
+    VEDirectGateway
+
+    CPython gateway that reads many VE.Direct ports (USB serial cables, ptys,
+    or any file descriptor) from a single thread, using selectors (epoll on
+    Linux). Each port only costs a parser; all ports share one read buffer.
+
+    gw = VEDirectGateway(callback=<callback(name, record)>, # Optional
+                         compact=False) # True for typecast VEDirectRecord objects
+    gw.add(name, port) # port: device path, open pyserial object, or file descriptor
+    gw.poll(timeout) # read whatever is ready, returns [(name, record), ...]
+    gw.run() # poll forever, or until stop()
+
+    stats()
+        returns {name: link quality counters}
+
+'''
+
+import errno
+import logging
+import os
+import selectors
+
+from vedirect.vedirect_base import VEDirectBase
+
+log = logging.getLogger(__name__)
+
+
+def open_port(path):
+    '''
+        Open a serial device (or pty) non-blocking, raw, 19200 8N1
+    '''
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    if os.isatty(fd):
+        import termios
+        attrs = termios.tcgetattr(fd)
+        attrs[0] = 0  # iflag: no input processing
+        attrs[1] = 0  # oflag
+        attrs[2] = termios.CS8 | termios.CREAD | termios.CLOCAL  # cflag
+        attrs[3] = 0  # lflag: raw, no echo
+        attrs[4] = attrs[5] = termios.B19200
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    return fd
+
+
+class _Port:
+    __slots__ = ("name", "fd", "owned", "ser", "parser")
+
+    def __init__(self, name, fd, owned, ser, parser):
+        self.name = name
+        self.fd = fd
+        self.owned = owned
+        self.ser = ser
+        self.parser = parser
+
+
+class VEDirectGateway:
+
+    # Bytes taken from a port per read
+    RX_CHUNK = 4096
+
+    def __init__(self, callback=None, compact=False):
+        self._callback = callback
+        self._compact = compact
+        self._selector = selectors.DefaultSelector()
+        self._ports = {}
+        self._buf = bytearray(self.RX_CHUNK)  # Shared: each chunk is parsed before the next read
+        self._mv = memoryview(self._buf)
+        self._running = False
+
+    def add(self, name, port):
+        '''
+            Start reading a port: a device path, an open pyserial object, or a file descriptor
+        '''
+        ser = None
+        owned = False
+        if isinstance(port, str):
+            fd = open_port(port)
+            owned = True
+        elif isinstance(port, int):
+            fd = port
+            os.set_blocking(fd, False)
+        else:
+            ser = port
+            fd = port.fileno()
+            os.set_blocking(fd, False)
+        entry = _Port(name, fd, owned, ser, VEDirectBase(self._compact))
+        self._ports[name] = entry
+        self._selector.register(fd, selectors.EVENT_READ, entry)
+        return entry.parser
+
+    def remove(self, name):
+        entry = self._ports.pop(name)
+        self._selector.unregister(entry.fd)
+        if entry.owned:
+            os.close(entry.fd)
+
+    def __len__(self):
+        return len(self._ports)
+
+    def parser(self, name):
+        return self._ports[name].parser
+
+    def stats(self):
+        return {name: entry.parser.stats() for name, entry in self._ports.items()}
+
+    def poll(self, timeout=None):
+        '''
+            Wait up to timeout seconds for input, read every ready port once and
+            return the completed records as (name, record) pairs
+        '''
+        records = []
+        mv = self._mv
+        for key, _ in self._selector.select(timeout):
+            entry = key.data
+            try:
+                n = os.readv(entry.fd, (self._buf,))
+            except BlockingIOError:
+                continue
+            except OSError as exc:
+                if exc.errno == errno.EINTR:
+                    continue
+                log.warning("Port %s failed (%s), removing it", entry.name, exc)
+                self.remove(entry.name)
+                continue
+            if not n:
+                log.warning("Port %s closed, removing it", entry.name)
+                self.remove(entry.name)
+                continue
+            for record in entry.parser.feed(mv[:n]):
+                records.append((entry.name, record))
+                if self._callback is not None:
+                    self._callback(entry.name, record)
+        return records
+
+    def run(self, timeout=1.0):
+        '''
+            Poll until stop() is called
+        '''
+        self._running = True
+        while self._running:
+            self.poll(timeout)
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        for name in list(self._ports):
+            self.remove(name)
+        self._selector.close()
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+    VEDirect HEX protocol
+
+    Framing and decoding for the HEX protocol described in
+    docs/BlueSolar-HEX-protocol-MPPT.pdf
+
+    A frame is ':' + command nibble + payload bytes + checksum byte, all as
+    ASCII hex, terminated by '\n'. The command, payload and checksum bytes
+    sum to 0x55. Get, Set and Async frames carry a little-endian register id,
+    a flags byte and the little-endian register value.
+
+    encode_frame(command, data=b"")
+        returns the frame bytes ready to write to the port
+
+    decode_frame(frame)
+        takes the frame without its leading ':' and returns a HexMessage,
+        raising ValueError if it is malformed
+'''
+
+from binascii import hexlify, unhexlify
+
+# Commands (requests from us, responses from the device share the numbering)
+PING = 0x1
+DONE = 0x1  # response
+APP_VERSION = 0x3
+UNKNOWN = 0x3  # response
+PRODUCT_ID = 0x4
+ERROR = 0x4  # response
+PING_RESPONSE = 0x5
+RESTART = 0x6
+GET = 0x7
+SET = 0x8
+ASYNC = 0xA
+
+# Response flags
+FLAG_UNKNOWN_ID = 0x01
+FLAG_NOT_SUPPORTED = 0x02
+FLAG_PARAMETER_ERROR = 0x04
+
+# Well known registers: id -> (name, size in bytes, signed, scale)
+registers = {
+    0x0100: ("productId", 4, False, 1),
+    0x0200: ("deviceMode", 1, False, 1),
+    0x0201: ("deviceState", 1, False, 1),
+    0xEDBB: ("panelVoltage", 2, False, 0.01),  # V
+    0xEDBC: ("panelPower", 4, False, 0.01),  # W
+    0xEDBD: ("panelCurrent", 2, False, 0.1),  # A
+    0xEDD5: ("chargerVoltage", 2, False, 0.01),  # V
+    0xEDD7: ("chargerCurrent", 2, False, 0.1),  # A
+    0xEDAD: ("loadCurrent", 2, False, 0.1),  # A
+    0xEDDA: ("chargerError", 1, False, 1),
+    0xEDD2: ("maximumPowerToday", 2, False, 1),  # W
+    0xEDD3: ("yieldToday", 2, False, 0.01),  # kWh
+    0xEDEC: ("batteryTemperature", 2, False, 0.01),  # K
+}
+
+REGISTER_COMMANDS = (GET, SET, ASYNC)
+
+
+class HexMessage:
+    __slots__ = ("command", "register", "flags", "data")
+
+    def __init__(self, command, register=None, flags=None, data=b""):
+        self.command = command
+        self.register = register
+        self.flags = flags
+        self.data = data
+
+    @property
+    def raw(self):
+        """The register value (or payload) as a little-endian integer"""
+        n = 0
+        for i in range(len(self.data) - 1, -1, -1):
+            n = (n << 8) | self.data[i]
+        return n
+
+    @property
+    def name(self):
+        info = registers.get(self.register)
+        return info[0] if info else None
+
+    @property
+    def value(self):
+        """The register value, scaled to engineering units where the register is known"""
+        info = registers.get(self.register)
+        n = self.raw
+        if info is None:
+            return n
+        size, signed, scale = info[1], info[2], info[3]
+        if signed and n >= 1 << (size * 8 - 1):
+            n -= 1 << (size * 8)
+        return n * scale if scale != 1 else n
+
+    def __eq__(self, other):
+        return (isinstance(other, HexMessage) and self.command == other.command
+                and self.register == other.register and self.flags == other.flags
+                and self.data == other.data)
+
+    def __repr__(self):
+        return "HexMessage(command={:X}, register={}, flags={}, data={})".format(
+            self.command, None if self.register is None else "0x{:04X}".format(self.register),
+            self.flags, bytes(self.data))
+
+
+def checksum(command, data):
+    return (0x55 - command - sum(data)) & 0xFF
+
+
+def encode_frame(command, data=b""):
+    """Build a complete frame, ':' to '\n', for command and payload bytes"""
+    return b":" + ("%X" % command).encode() + hexlify(bytes(data) + bytes((checksum(command, data),))).upper() + b"\n"
+
+
+def encode_register(command, register, flags=0, data=b""):
+    """Build a Get or Set frame for register"""
+    return encode_frame(command, bytes((register & 0xFF, register >> 8, flags)) + bytes(data))
+
+
+def decode_frame(frame):
+    """Decode a frame (without the ':' and newline) into a HexMessage"""
+    if len(frame) < 3:
+        raise ValueError("HEX frame too short")
+    command = int(chr(frame[0]), 16)
+    payload = unhexlify(frame[1:])
+    if (command + sum(payload)) & 0xFF != 0x55:
+        raise ValueError("HEX frame checksum")
+    payload = payload[:-1]
+    if command in REGISTER_COMMANDS and len(payload) >= 3:
+        return HexMessage(command, payload[0] | (payload[1] << 8), payload[2], payload[3:])
+    return HexMessage(command, data=payload)
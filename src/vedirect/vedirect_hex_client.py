@@ -0,0 +1,165 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+
+    VEDirectHexClient
+
+    Polls HEX protocol registers over a VEDirect or VEDirectAsyncio session,
+    alongside the 1 Hz text records the session already delivers.
+
+    VEDirectHexClient(ve, # VEDirect or VEDirectAsyncio (anything with write() and set_hex_handler())
+                      registers={0xEDBC: 250, 0xEDD7: 250}, # Optional, register id -> poll interval ms
+                      depth=4, # Requests allowed in flight at once
+                      rate=40, # Requests per second, keeps clear of the text output
+                      timeout=500, # ms before an unanswered request is given up
+                      callback=<callback(register, HexMessage)>) # Optional
+
+    get(register), set(register, data), ping()
+        send a request now if the pipeline has room, returns True if sent
+
+    service()
+        expire overdue requests and send whatever polls are due; call it often
+        (run() does this on asyncio)
+
+    values
+        register id -> last HexMessage received for it
+
+    Responses are matched to requests by register id, so several reads can be
+    in flight at once and may complete in any order.
+
+'''
+
+import logging
+import asyncio
+
+from vedirect.vedirect_base import ticks_ms, ticks_add, ticks_diff
+from vedirect.vedirect_hex import GET, SET, ASYNC, PING, PING_RESPONSE, encode_frame, encode_register
+
+log = logging.getLogger(__name__)
+
+
+class VEDirectHexClient:
+
+    def __init__(self, ve, registers=None, depth=4, rate=40, timeout=500, callback=None, tick=20):
+        self._ve = ve
+        self._depth = depth
+        self._rate = rate
+        self._timeout = timeout
+        self._callback = callback
+        self._tick = tick
+        self._polls = {}  # register -> [interval ms, next due ticks or None for now]
+        self._pending = {}  # register -> ticks sent; None for a ping
+        self._tokens = depth
+        self._refilled = None
+        self.values = {}
+        self.sent = 0
+        self.received = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latency_ms = 0
+        for register, interval in (registers or {}).items():
+            self._polls[register] = [interval, None]
+        ve.set_hex_handler(self._on_message)
+
+    def poll(self, register, interval):
+        '''
+            Add or change the poll interval for a register, None to stop polling it
+        '''
+        if interval is None:
+            self._polls.pop(register, None)
+        else:
+            self._polls[register] = [interval, None]
+
+    def _refill(self, now):
+        if self._refilled is None:
+            self._refilled = now
+        elapsed = ticks_diff(now, self._refilled)
+        if elapsed > 0:
+            self._tokens = min(self._depth, self._tokens + elapsed * self._rate / 1000)
+            self._refilled = now
+
+    def _send(self, key, frame, now):
+        if len(self._pending) >= self._depth or self._tokens < 1 or key in self._pending:
+            return False
+        self._tokens -= 1
+        self._pending[key] = now
+        self._ve.write(frame)
+        self.sent += 1
+        return True
+
+    def get(self, register, now=None):
+        now = ticks_ms() if now is None else now
+        self._refill(now)
+        return self._send(register, encode_register(GET, register), now)
+
+    def set(self, register, data, flags=0, now=None):
+        now = ticks_ms() if now is None else now
+        self._refill(now)
+        return self._send(register, encode_register(SET, register, flags, data), now)
+
+    def ping(self, now=None):
+        now = ticks_ms() if now is None else now
+        self._refill(now)
+        return self._send(None, encode_frame(PING), now)
+
+    def service(self, now=None):
+        '''
+            Give up on overdue requests and send the polls that are due.
+            Returns the number of requests sent
+        '''
+        now = ticks_ms() if now is None else now
+        self._refill(now)
+        for key, sent in list(self._pending.items()):
+            if ticks_diff(now, sent) > self._timeout:
+                del self._pending[key]
+                self.timeouts += 1
+        count = 0
+        for register, poll in self._polls.items():
+            due = poll[1]
+            if (due is not None and ticks_diff(now, due) < 0) or register in self._pending:
+                continue
+            if not self._send(register, encode_register(GET, register), now):
+                if len(self._pending) >= self._depth or self._tokens < 1:
+                    break
+                continue
+            count += 1
+            # Stay on the schedule, but don't try to catch up after falling behind
+            poll[1] = ticks_add(now if due is None else due, poll[0])
+            if ticks_diff(now, poll[1]) > 0:
+                poll[1] = ticks_add(now, poll[0])
+        return count
+
+    def _on_message(self, message):
+        key = None if message.command == PING_RESPONSE else message.register
+        sent = self._pending.pop(key, None)
+        if sent is not None:
+            self.received += 1
+            self.latency_ms = ticks_diff(ticks_ms(), sent)
+        elif message.command != ASYNC:
+            return  # Answer to a request we've already given up on
+        if message.flags:
+            self.errors += 1
+            log.warning("HEX register 0x%04X flags 0x%02X", message.register, message.flags)
+            return
+        if key is not None:
+            self.values[key] = message
+        if self._callback is not None:
+            self._callback(key, message)
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "received": self.received,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "latency_ms": self.latency_ms,
+            "in_flight": len(self._pending),
+        }
+
+    async def run(self):
+        '''
+            Service the poll schedule forever, e.g. asyncio.create_task(client.run())
+        '''
+        while True:
+            self.service()
+            await asyncio.sleep(self._tick / 1000)
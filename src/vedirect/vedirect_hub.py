@@ -0,0 +1,151 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+
+    VEDirectHub
+
+    Reads several VE.Direct devices (e.g. MPPT, BMV and inverter on an ESP32's
+    UARTs) and merges their records into one queue.
+
+    VEDirectHub(ports={"mppt": <pre-initialised UART>, # This...
+                       "bmv": (<UART Id>, <RX Pin>, <TX Pin>)}, # or this, per port
+                callback=<callback(port, pid, serial, record)>, # Optional, made off the read loop
+                queue=8, # Tagged records held for getRecord(); oldest dropped beyond
+                compact=False) # True for typecast VEDirectRecord objects
+
+    getEvent()
+        returns an asyncio.Event set whenever a record arrives from any port.
+        Call Event.clear() when notified
+
+    getRecord()
+        returns the oldest (port, pid, serial, record) tuple, or None
+
+    stats()
+        returns {port: link quality counters}, plus the hub's own under "hub"
+        and the callback's (see CallbackDispatcher) under "callback"
+
+    Each port costs a parser and a small reader coroutine that sleeps on the
+    UART stream until input arrives, so idle ports cost nothing and one busy
+    port can't starve the others: each read is capped at RX_CHUNK bytes and
+    the reader yields to the scheduler after every chunk.
+
+'''
+
+import logging
+import asyncio
+from micropython import const
+
+log = logging.getLogger(__name__)
+
+from vedirect.vedirect_base import VEDirectBase
+from vedirect.vedirect_dispatch import CallbackDispatcher
+
+try:
+    from machine import UART
+except ImportError:
+    UART = None
+
+
+class _Port:
+    __slots__ = ("name", "stream", "parser")
+
+    def __init__(self, name, stream, parser):
+        self.name = name
+        self.stream = stream
+        self.parser = parser
+
+
+class VEDirectHub:
+
+    # Bytes taken from one port before the next gets its turn
+    RX_CHUNK = const(128)
+
+    def __init__(self, ports, callback=None, queue=8, compact=False):
+        self._callback = None if callback is None else CallbackDispatcher(callback)
+        self._queueMax = queue
+        self._recordQ = []
+        self._recordReady = asyncio.Event()
+        self.dropped = 0
+        self._ports = []
+        for name, spec in ports.items():
+            self._ports.append(_Port(name, self._open(name, spec), VEDirectBase(compact)))
+        log.info("starting %d port readers", len(self._ports))
+        self._run = [asyncio.create_task(self._go(port)) for port in self._ports]
+
+    def _open(self, name, uart):
+        '''
+            Return the stream for a port: an initialised UART
+        '''
+        if isinstance(uart, tuple):
+            uartId, rx, tx = uart
+            log.info("Opening UART %s for %s, rx %d tx %d", uartId, name, rx, tx)
+            uart = UART(uartId)
+            uart.init(baudrate=19200, rx=rx, tx=tx)
+        else:
+            uart.init(baudrate=19200) # We assume you've used the pins you want to
+        return uart
+
+    def _port(self, name):
+        for port in self._ports:
+            if port.name == name:
+                return port
+        raise KeyError(name)
+
+    def getRecord(self):
+        '''
+            Return the oldest (port, pid, serial, record), if present, otherwise None
+        '''
+        if self._recordQ:
+            return self._recordQ.pop(0)
+        return None
+
+    def getEvent(self):
+        '''
+            Return the "record arrived" Event for the caller to wait on
+            The caller must call Event.clear() when it receives the Event
+        '''
+        return self._recordReady
+
+    def parser(self, name):
+        '''
+            Return the parser for a port, e.g. to use with VEDirectHexClient
+        '''
+        return self._port(name).parser
+
+    def stats(self):
+        result = {port.name: port.parser.stats() for port in self._ports}
+        result["hub"] = {"queued": len(self._recordQ), "dropped": self.dropped}
+        if self._callback is not None:
+            result["callback"] = self._callback.stats()
+        return result
+
+    def _deliver(self, port, record):
+        tagged = (port.name, record.get("PID"), record.get("SER#"), record)
+        if len(self._recordQ) >= self._queueMax:
+            self._recordQ.pop(0)
+            self.dropped += 1
+        self._recordQ.append(tagged)
+        if self._callback is not None:
+            self._callback.submit(*tagged)
+        self._recordReady.set()
+
+    async def _go(self, port):
+        '''
+            Reader for one port: sleeps on the UART stream, parses each chunk
+        '''
+        reader = asyncio.StreamReader(port.stream)
+        buf = bytearray(self.RX_CHUNK)
+        mv = memoryview(buf)
+        readinto = getattr(reader, "readinto", None) # Not on older MicroPython releases
+        parser = port.parser
+        while True:
+            if readinto is not None:
+                n = await readinto(buf)
+                chunk = mv[:n]
+            else:
+                chunk = await reader.read(self.RX_CHUNK)
+                n = len(chunk)
+            if n:
+                for record in parser.feed(chunk):
+                    self._deliver(port, record)
+            await asyncio.sleep(0) # Let the other ports have a turn
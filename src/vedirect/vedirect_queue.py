@@ -0,0 +1,178 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+
+    RecordQueue
+
+    Bounded FIFO between the read loop and whoever consumes records, with a
+    choice of what happens when the consumer falls behind, and counters that
+    show how often it did.
+
+    q = RecordQueue(capacity=8, policy=RecordQueue.DROP_OLDEST)
+
+    Policies, when a record arrives and the queue is full:
+        DROP_OLDEST  the oldest queued record is dropped (the default)
+        DROP_NEWEST  the arriving record is dropped
+        COALESCE     the arriving record replaces the newest queued one, so
+                     the consumer still gets the latest state
+        BLOCK        the producer waits for room (put() only; put_nowait()
+                     refuses), pushing back on the read loop
+
+    put_nowait(record) -> False if refused (BLOCK and full)
+    await put(record)
+    get_nowait() -> oldest record, or None
+    await get() -> oldest record, waiting for one
+    stats() -> {"capacity", "policy", "queued", "enqueued", "dropped",
+                "coalesced", "blocked", "high_water"}
+
+    RecordSubscription
+
+    One consumer's own RecordQueue on a record stream, iterated with async
+    for; see VEDirectAsyncio.records(). A slow subscriber only overflows its
+    own queue, under its own policy.
+
+    async with ve.records() as sub: # Unsubscribes on the way out
+        async for record in sub:
+            ...
+
+    close() stops delivery to a subscription made without async with
+
+'''
+
+import asyncio
+from micropython import const
+
+
+class RecordQueue:
+
+    DROP_OLDEST = "drop-oldest"
+    DROP_NEWEST = "drop-newest"
+    COALESCE = "coalesce"
+    BLOCK = "block"
+    POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE, BLOCK)
+
+    CAPACITY = const(8)
+
+    def __init__(self, capacity=CAPACITY, policy=DROP_OLDEST):
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown queue policy %s" % policy)
+        if capacity < 1:
+            raise ValueError("Queue capacity must be at least 1")
+        self.capacity = capacity
+        self.policy = policy
+        self._items = []
+        self._notEmpty = asyncio.Event()
+        self._notFull = asyncio.Event()
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "policy": self.policy,
+            "queued": len(self._items),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "blocked": self.blocked,
+            "high_water": self.high_water,
+        }
+
+    def _append(self, record):
+        items = self._items
+        items.append(record)
+        self.enqueued += 1
+        if len(items) > self.high_water:
+            self.high_water = len(items)
+        self._notEmpty.set()
+
+    def put_nowait(self, record):
+        '''
+            Queue a record, applying the policy if full; False if refused under BLOCK
+        '''
+        items = self._items
+        if len(items) < self.capacity:
+            self._append(record)
+            return True
+        policy = self.policy
+        if policy == self.DROP_OLDEST:
+            items.pop(0)
+            self.dropped += 1
+            self._append(record)
+        elif policy == self.DROP_NEWEST:
+            self.dropped += 1
+        elif policy == self.COALESCE:
+            items[-1] = record
+            self.coalesced += 1
+        else:
+            return False
+        return True
+
+    async def put(self, record):
+        '''
+            Queue a record, waiting for room if the policy is BLOCK
+        '''
+        if self.put_nowait(record):
+            return
+        self.blocked += 1
+        while len(self._items) >= self.capacity:
+            self._notFull.clear()
+            await self._notFull.wait()
+        self._append(record)
+
+    def get_nowait(self):
+        '''
+            Take the oldest record, or None
+        '''
+        items = self._items
+        if not items:
+            return None
+        record = items.pop(0)
+        if not items:
+            self._notEmpty.clear()
+        self._notFull.set()
+        return record
+
+    async def get(self):
+        '''
+            Take the oldest record, waiting for one
+        '''
+        while not self._items:
+            await self._notEmpty.wait()
+        return self.get_nowait()
+
+
+class RecordSubscription:
+
+    def __init__(self, subscribers, capacity=RecordQueue.CAPACITY, policy=RecordQueue.DROP_OLDEST):
+        self.queue = RecordQueue(capacity, policy)
+        self._subscribers = subscribers
+        subscribers.append(self)
+
+    def close(self):
+        '''
+            Stop receiving records
+        '''
+        if self in self._subscribers:
+            self._subscribers.remove(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        return self.queue.stats()
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+    VEDirectRecord
+
+    Compact alternative to the per-record dict. The key names and their
+    positions live once in a RecordProfile shared by every record from the
+    same device key sequence; each record only holds a tuple of its values.
+    Dict-style read access is kept, so most callers need not care.
+
+    record["V"], record.get("I"), "SOC" in record, record.items(),
+    record.to_dict(), and == against a dict or another record
+'''
+
+
+class RecordProfile:
+    __slots__ = ("keys", "index")
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = {key: i for i, key in enumerate(keys)}
+
+
+class VEDirectRecord:
+    __slots__ = ("profile", "values")
+
+    def __init__(self, profile, values):
+        self.profile = profile
+        self.values = values
+
+    def __getitem__(self, key):
+        return self.values[self.profile.index[key]]
+
+    def get(self, key, default=None):
+        i = self.profile.index.get(key)
+        return default if i is None else self.values[i]
+
+    def __contains__(self, key):
+        return key in self.profile.index
+
+    def __iter__(self):
+        return iter(self.profile.keys)
+
+    def __len__(self):
+        return len(self.values)
+
+    def keys(self):
+        return self.profile.keys
+
+    def items(self):
+        return zip(self.profile.keys, self.values)
+
+    def to_dict(self):
+        return dict(zip(self.profile.keys, self.values))
+
+    def __eq__(self, other):
+        if isinstance(other, VEDirectRecord):
+            return self.profile.keys == other.profile.keys and self.values == other.values
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return "VEDirectRecord({})".format(self.to_dict())
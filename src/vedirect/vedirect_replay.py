@@ -0,0 +1,237 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+
+    VEDirectReplay
+
+    Re-parses raw VE.Direct captures (the emulator's --file output, or a tee of
+    the serial port) at memory speed. The capture is mmap'ed and scanned in
+    place: blocks are framed by searching for the Checksum field and validated
+    over memoryview slices (numpy, if installed, sums a whole batch of blocks
+    at once), so nothing is copied until a record is decoded. CPython only.
+
+    with VEDirectReplay(<path, or bytes-like>, compact=False) as replay:
+        for record in replay.records(): # dicts, or VEDirectRecord with compact=True
+            ...
+        for start, end in replay.offsets(): # byte span of every valid block
+            ...
+
+    Both take start= and end= to scan part of the capture. A block's checksum
+    covers everything from the end of the previous block; a block that fails
+    is salvaged from the first field start whose checksum comes out right,
+    as the serial parser does. HEX frames inside a block are left out of its
+    checksum and fields.
+
+    stats()
+        returns {"records", "checksum_errors", "resyncs", "bytes_discarded"}
+
+'''
+
+import logging
+import mmap
+from zlib import adler32
+
+try:
+    import numpy  # Optional: checks a whole batch of blocks per call
+except ImportError:
+    numpy = None
+
+log = logging.getLogger(__name__)
+
+from vedirect.vedirect_base import VEDirectBase
+
+MARK = b"\nChecksum\t"
+
+
+def block_sum(mv, start, end):
+    '''
+        Sum of mv[start:end] modulo 256. adler32's low half is the byte sum
+        modulo 65521, exact for up to 256 bytes at a time.
+    '''
+    total = 0
+    while start < end:
+        n = min(end, start + 256)
+        total += adler32(mv[start:n], 0) & 0xFFFF
+        start = n
+    return total & 0xFF
+
+
+def strip_hex(data):
+    '''
+        Remove HEX frames (':' up to and including the newline) from a block's bytes
+    '''
+    parts = []
+    pos = 0
+    while True:
+        colon = data.find(b":", pos)
+        if colon < 0:
+            parts.append(data[pos:])
+            return b"".join(parts)
+        parts.append(data[pos:colon])
+        nl = data.find(b"\n", colon)
+        if nl < 0:
+            return b"".join(parts)
+        pos = nl + 1
+
+
+class VEDirectReplay:
+
+    # Blocks framed before their checksums are checked together
+    BATCH = 1024
+
+    def __init__(self, source, compact=False):
+        self.compact = compact
+        self._file = None
+        self._map = None
+        if isinstance(source, str):
+            self._file = open(source, "rb")
+            try:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # Empty file
+                self._map = b""
+            source = self._map
+        self.buf = source
+        self.mv = memoryview(source)
+        self._array = None if numpy is None else numpy.frombuffer(source, dtype=numpy.uint8)
+        self._first = b"PID"  # Key that opens a block, from the last good one
+        self.records_out = 0
+        self.checksum_errors = 0
+        self.resyncs = 0
+        self.bytes_discarded = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._array = None
+        self.mv.release()
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __len__(self):
+        return len(self.buf)
+
+    def stats(self):
+        return {
+            "records": self.records_out,
+            "checksum_errors": self.checksum_errors,
+            "resyncs": self.resyncs,
+            "bytes_discarded": self.bytes_discarded,
+        }
+
+    def _hex_sum(self, start, end):
+        # Checksum of the text with any HEX frames left out; the checksum byte may itself be ':'
+        return (sum(strip_hex(bytes(self.mv[start:end - 1]))) + self.buf[end - 1]) & 0xFF
+
+    def _salvage(self, start, mark, end):
+        '''
+            The block start, after start, whose checksum comes out right, or -1.
+            Only fields with the key that opened the last good block are tried,
+            so that a tail of a damaged block rarely passes by chance.
+        '''
+        buf = self.buf
+        head = b"\n" + self._first + b"\t"
+        at = buf.find(head, start + 1, mark)
+        while at >= 0:
+            for cand in (at - 1, at) if buf[at - 1] == 13 else (at,):
+                if block_sum(self.mv, cand, end) == 0:
+                    return cand
+            at = buf.find(head, at + 1, mark)
+        return -1
+
+    def _opening(self, pos):
+        nl = self.buf.find(b"\n", pos)
+        tab = self.buf.find(b"\t", nl)
+        if 0 <= nl < tab <= nl + 1 + VEDirectBase.KEY_MAX:
+            self._first = self.buf[nl + 1:tab]
+
+    def _sums(self, pos, stops):
+        '''
+            Checksums of the blocks that run from pos to each of stops in turn
+        '''
+        if self._array is not None:
+            starts = numpy.array([pos] + stops[:-1]) - pos
+            return numpy.add.reduceat(self._array[pos:stops[-1]], starts, dtype=numpy.uint8).tolist()
+        mv = self.mv
+        sums = []
+        for stop in stops:
+            # Most blocks are under 256 bytes: one adler32 call
+            if stop - pos <= 256:
+                sums.append(adler32(mv[pos:stop], 0) & 0xFF)
+            else:
+                sums.append(block_sum(mv, pos, stop))
+            pos = stop
+        return sums
+
+    def offsets(self, start=0, end=None):
+        '''
+            Yield (start, end) of every checksum-valid block in buf[start:end]
+        '''
+        buf = self.buf
+        if end is None:
+            end = len(buf)
+        find = buf.find
+        tail = len(MARK) + 1
+        pos = start
+        good = 0
+        while True:
+            # Frame a batch of blocks, then check all their sums in one go
+            stops = []
+            mark = find(MARK, pos, end)
+            while mark >= 0 and mark + tail <= end and len(stops) < self.BATCH:
+                stops.append(mark + tail)
+                mark = find(MARK, mark + tail, end)
+            if not stops:
+                return
+            for stop, total in zip(stops, self._sums(pos, stops)):
+                if total == 0 or (find(b":", pos, stop - 1) >= 0 and self._hex_sum(pos, stop) == 0):
+                    good += 1
+                    if good & 0xFF == 1:  # Now and then: the opening key rarely changes
+                        self._opening(pos)
+                    yield pos, stop
+                else:
+                    first = self._salvage(pos, stop - tail, stop)
+                    if first >= 0:
+                        self.resyncs += 1
+                        self.bytes_discarded += first - pos
+                        yield first, stop
+                    else:
+                        log.error("Malformed record at %d", pos)
+                        self.checksum_errors += 1
+                        self.bytes_discarded += stop - pos
+                pos = stop
+
+    def decode(self, start, end):
+        '''
+            The record held in buf[start:end], as a dict of strings, or None if it won't decode
+        '''
+        data = bytes(self.mv[start:end - len(MARK)])  # Up to the newline before Checksum
+        if b":" in data:
+            data = strip_hex(data)
+        try:
+            # Carriage returns are optional, and only ever end a value
+            lines = str(data, VEDirectBase.encoding).replace("\r\n", "\n").split("\n")
+        except UnicodeError:
+            self.checksum_errors += 1
+            return None
+        try:
+            return dict(line.split("\t", 1) for line in lines[1:-1])
+        except ValueError:  # A field without a tab
+            self.checksum_errors += 1
+            return None
+
+    def records(self, start=0, end=None):
+        '''
+            Yield every valid record in buf[start:end]
+        '''
+        for first, last in self.offsets(start, end):
+            record = self.decode(first, last)
+            if record is None:
+                continue
+            self.records_out += 1
+            yield VEDirectBase.typecast_compact(record) if self.compact else record
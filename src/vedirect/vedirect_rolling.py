@@ -0,0 +1,226 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+
+    VEDirectRollingStats
+
+    Min/max/mean/last of chosen fields over rolling time windows, kept up to
+    date record by record so a dashboard can ask at any time without a rescan.
+    Runs on MicroPython (ESP32) as well as CPython.
+
+    stats = VEDirectRollingStats(keys=("V", "I", "PPV"), # Typecast fields to follow
+                                 windows=(60, 900, 3600), # Window lengths, seconds
+                                 buckets=60) # Resolution: each window is cut into this many buckets
+    ve = VEDirectAsyncio(..., callback=lambda record: stats.add(VEDirectBase.typecast(record)))
+
+    add(record, now=None)
+        takes a typecast dict or VEDirectRecord; now is ticks_ms(), by default
+
+    get(key, window, now=None)
+        returns {"min", "max", "mean", "last", "count"} for one key and window
+        length, or None if the key had no values in that window
+
+    snapshot(now=None)
+        returns {key: {window: get(key, window)}}
+
+    Each window is a ring of buckets, each holding the min, max, sum and
+    count of the values that fell in it, plus running totals and a monotonic
+    deque of bucket minimums (and maximums) for the buckets still in the
+    window. Adding a value touches only the current bucket; closing a bucket
+    is O(1) amortised; a query combines the deque fronts and totals with the
+    current bucket. A window therefore covers its length to within one
+    bucket. Memory is fixed at construction: about 32 bytes per bucket, per
+    key, per window (60 buckets, 3 keys and 3 windows come to some 17 KB).
+
+'''
+
+import logging
+from array import array
+from micropython import const
+
+log = logging.getLogger(__name__)
+
+from vedirect.vedirect_base import ticks_ms, ticks_add, ticks_diff
+
+
+class _MinQueue:
+    '''
+        Monotonic deque of (bucket number, value), values increasing from the
+        front, in a fixed ring; the front is the minimum of what's left
+    '''
+    __slots__ = ("seqs", "vals", "head", "size")
+
+    def __init__(self, n):
+        self.seqs = array("i", [0] * n)
+        self.vals = array("f", [0] * n)
+        self.head = 0
+        self.size = 0
+
+    def push(self, seq, value):
+        n = len(self.seqs)
+        vals = self.vals
+        # Buckets that can no longer be the minimum go
+        while self.size and vals[(self.head + self.size - 1) % n] >= value:
+            self.size -= 1
+        i = (self.head + self.size) % n
+        self.seqs[i] = seq
+        vals[i] = value
+        self.size += 1
+
+    def expire(self, oldest):
+        n = len(self.seqs)
+        while self.size and self.seqs[self.head] < oldest:
+            self.head = (self.head + 1) % n
+            self.size -= 1
+
+    def front(self):
+        return self.vals[self.head] if self.size else None
+
+    def clear(self):
+        self.head = self.size = 0
+
+
+class _Series:
+    '''
+        One key in one window: its bucket ring, running totals and deques
+    '''
+    __slots__ = ("mins", "maxs", "sums", "counts", "total", "count", "low", "high")
+
+    def __init__(self, n):
+        self.mins = array("f", [0] * n)
+        self.maxs = array("f", [0] * n)
+        self.sums = array("f", [0] * n)
+        self.counts = array("i", [0] * n)
+        self.total = 0.0  # Sum and count over the closed buckets in the window
+        self.count = 0
+        self.low = _MinQueue(n)
+        self.high = _MinQueue(n)  # Of negated maximums
+
+    def add(self, slot, value):
+        counts = self.counts
+        if counts[slot]:
+            if value < self.mins[slot]:
+                self.mins[slot] = value
+            if value > self.maxs[slot]:
+                self.maxs[slot] = value
+            self.sums[slot] += value
+        else:
+            self.mins[slot] = self.maxs[slot] = self.sums[slot] = value
+        counts[slot] += 1
+
+    def close(self, seq, n):
+        '''
+            Bucket seq is complete; bucket seq + 1, whose slot held seq + 1 - n, opens
+        '''
+        slot = seq % n
+        if self.counts[slot]:
+            self.total += self.sums[slot]
+            self.count += self.counts[slot]
+            self.low.push(seq, self.mins[slot])
+            self.high.push(seq, -self.maxs[slot])
+        nxt = (seq + 1) % n
+        if self.counts[nxt]:
+            self.total -= self.sums[nxt]
+            self.count -= self.counts[nxt]
+            self.counts[nxt] = 0
+        oldest = seq + 2 - n
+        self.low.expire(oldest)
+        self.high.expire(oldest)
+        if nxt == 0:
+            # Once a lap, total afresh so rounding can't build up
+            self.total = sum(self.sums[i] for i in range(n) if self.counts[i])
+
+    def clear(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.total = 0.0
+        self.count = 0
+        self.low.clear()
+        self.high.clear()
+
+    def stats(self, slot):
+        count = self.count + self.counts[slot]
+        if not count:
+            return None
+        low = self.low.front()
+        high = self.high.front()
+        high = None if high is None else -high
+        total = self.total
+        if self.counts[slot]:
+            low = self.mins[slot] if low is None else min(low, self.mins[slot])
+            high = self.maxs[slot] if high is None else max(high, self.maxs[slot])
+            total += self.sums[slot]
+        return {"min": low, "max": high, "mean": total / count, "count": count}
+
+
+class _Window:
+    __slots__ = ("bucket_ms", "n", "seq", "start", "series")
+
+    def __init__(self, seconds, buckets, keys):
+        self.bucket_ms = seconds * 1000 // buckets
+        self.n = buckets
+        self.seq = 0
+        self.start = None  # When the current bucket opened
+        self.series = {key: _Series(buckets) for key in keys}
+
+    def advance(self, now):
+        if self.start is None:
+            self.start = now
+            return
+        closed = 0
+        while ticks_diff(now, self.start) >= self.bucket_ms:
+            if closed == self.n:
+                # Quiet for longer than the window: nothing in it is current
+                for series in self.series.values():
+                    series.clear()
+                skip = ticks_diff(now, self.start) // self.bucket_ms
+                self.seq += skip
+                self.start = ticks_add(self.start, skip * self.bucket_ms)
+                return
+            for series in self.series.values():
+                series.close(self.seq, self.n)
+            self.seq += 1
+            self.start = ticks_add(self.start, self.bucket_ms)
+            closed += 1
+
+
+class VEDirectRollingStats:
+
+    BUCKETS = const(60)
+
+    def __init__(self, keys=("V", "I", "PPV"), windows=(60, 900, 3600), buckets=BUCKETS):
+        self.keys = keys
+        self._windows = {seconds: _Window(seconds, buckets, keys) for seconds in windows}
+        self.last = {}
+
+    def add(self, record, now=None):
+        '''
+            Fold in the followed fields of a typecast record
+        '''
+        if now is None:
+            now = ticks_ms()
+        for window in self._windows.values():
+            window.advance(now)
+        for key in self.keys:
+            value = record.get(key)
+            if value is None:
+                continue
+            self.last[key] = value
+            for window in self._windows.values():
+                window.series[key].add(window.seq % window.n, value)
+
+    def get(self, key, window, now=None):
+        '''
+            Stats for one key over one window length (seconds), or None
+        '''
+        win = self._windows[window]
+        win.advance(ticks_ms() if now is None else now)
+        result = win.series[key].stats(win.seq % win.n)
+        if result is not None:
+            result["last"] = self.last.get(key)
+        return result
+
+    def snapshot(self, now=None):
+        if now is None:
+            now = ticks_ms()
+        return {key: {window: self.get(key, window, now) for window in self._windows} for key in self.keys}
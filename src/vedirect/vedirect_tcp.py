@@ -0,0 +1,344 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+'''
+
+    VE.Direct over TCP
+
+    For devices reached through ser2net or an ESP32 Wi-Fi serial bridge, which
+    pass the raw 19200 baud byte stream through a TCP socket.
+
+    TCPPort(host, port, timeout=1.0) # Blocking, serial-like; pass it to VEDirect
+        ve = VEDirect(TCPPort("bridge.local", 3333)) # or VEDirect("tcp://bridge.local:3333")
+
+    TCPLink(host, port) # asyncio; used by VEDirectAsyncio(host=, port=) and VEDirectTCPPool
+        await link.run(<async on_chunk(chunk)>) # connects, reads, reconnects, forever
+
+    VEDirectTCPPool(bridges={"mppt": ("10.0.0.5", 3333), ...}, # Many bridges, one asyncio loop
+                    callback=<callback(name, pid, serial, record)>, # Optional
+                    queue=8, compact=False)
+        works like VEDirectHub; stats() adds each connection's health()
+
+    Both keep the connection open between records. A dropped or refused
+    connection is retried after retry_min ms, doubling up to retry_max ms;
+    the delay goes back to retry_min once data flows again.
+
+    health()
+        returns {"connected", "connects", "disconnects", "failures", "bytes_in",
+                 "retry_ms", "last_error"}
+
+'''
+
+import errno
+import logging
+import socket
+import time
+import asyncio
+from micropython import const
+
+log = logging.getLogger(__name__)
+
+from vedirect.vedirect_base import ticks_ms, ticks_add, ticks_diff
+from vedirect.vedirect_hub import VEDirectHub
+
+# CPython raises socket.timeout, MicroPython OSError(ETIMEDOUT) or EAGAIN
+_TIMEOUT = getattr(socket, "timeout", ())
+
+
+def _timed_out(exc):
+    return isinstance(exc, _TIMEOUT) or (bool(exc.args) and exc.args[0] in (errno.ETIMEDOUT, errno.EAGAIN))
+
+
+def parse_url(url):
+    '''
+        "tcp://host:port" -> (host, port)
+    '''
+    host, _, port = url[len("tcp://"):].rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError("Expected tcp://host:port, got %s" % url)
+    return host, int(port)
+
+
+class _Health:
+    '''
+        Connection counters and reconnect backoff, shared by both transports
+    '''
+
+    RETRY_MIN = const(500)
+    RETRY_MAX = const(30000)
+
+    def __init__(self, host, port, retry_min=RETRY_MIN, retry_max=RETRY_MAX):
+        self.host = host
+        self.port = port
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.retry_ms = retry_min
+        self.connected = False
+        self.connects = 0
+        self.disconnects = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.last_error = None
+        self._flowing = False
+
+    def health(self):
+        return {
+            "connected": self.connected,
+            "connects": self.connects,
+            "disconnects": self.disconnects,
+            "failures": self.failures,
+            "bytes_in": self.bytes_in,
+            "retry_ms": self.retry_ms,
+            "last_error": self.last_error,
+        }
+
+    def _up(self):
+        self.connected = True
+        self.connects += 1
+        self._flowing = False
+        log.info("Connected to %s:%d", self.host, self.port)
+
+    def _data(self, n):
+        self.bytes_in += n
+        if not self._flowing:
+            # Only now is the link known good; a bridge that accepts and drops
+            # straight away must not be retried at full speed
+            self._flowing = True
+            self.retry_ms = self.retry_min
+
+    def _down(self, error):
+        '''
+            Record a failed connect or a lost connection; returns the ms to wait before retrying
+        '''
+        if self.connected:
+            self.disconnects += 1
+        else:
+            self.failures += 1
+        self.connected = False
+        self.last_error = str(error)
+        delay = self.retry_ms
+        self.retry_ms = min(self.retry_ms * 2, self.retry_max)
+        log.warning("%s:%d %s, retrying in %d ms", self.host, self.port, error, delay)
+        return delay
+
+
+class TCPPort(_Health):
+    '''
+        Blocking, serial-like TCP connection: read/readinto/write, in_waiting and timeout,
+        reconnecting by itself. Reads while disconnected wait out the timeout and return nothing.
+    '''
+
+    # What in_waiting reports when the socket is readable; the real amount isn't known
+    RX_HINT = const(4096)
+
+    def __init__(self, host, port, timeout=1.0, retry_min=_Health.RETRY_MIN, retry_max=_Health.RETRY_MAX):
+        super().__init__(host, port, retry_min, retry_max)
+        self.timeout = timeout
+        self._sock = None
+        self._poller = None
+        self._retry_at = None
+
+    def __str__(self):
+        return "tcp://%s:%d" % (self.host, self.port)
+
+    def _connect(self):
+        if self._sock is not None:
+            return self._sock
+        if self._retry_at is not None and ticks_diff(self._retry_at, ticks_ms()) > 0:
+            return None
+        sock = None
+        try:
+            family, kind, proto, _, addr = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0]
+            sock = socket.socket(family, kind, proto)
+            sock.settimeout(self.timeout)
+            sock.connect(addr)
+        except OSError as exc:
+            if sock is not None:
+                sock.close()
+            self._retry_at = ticks_add(ticks_ms(), self._down(exc))
+            return None
+        self._sock = sock
+        self._retry_at = None
+        import select
+        self._poller = select.poll()
+        self._poller.register(sock, select.POLLIN)
+        self._up()
+        return sock
+
+    def _drop(self, error):
+        self._sock.close()
+        self._sock = None
+        self._poller = None
+        self._retry_at = ticks_add(ticks_ms(), self._down(error))
+
+    def _idle(self, wait_ms):
+        '''
+            Disconnected: wait until the next retry is due, but no longer than wait_ms
+        '''
+        if self._retry_at is not None:
+            wait_ms = min(wait_ms, max(0, ticks_diff(self._retry_at, ticks_ms())))
+        if wait_ms > 0:
+            time.sleep(wait_ms / 1000)
+
+    def wait(self, wait_ms):
+        '''
+            True once input is waiting, False if none arrives within wait_ms
+        '''
+        sock = self._connect()
+        if sock is None:
+            self._idle(wait_ms)
+            return False
+        return bool(self._poller.poll(max(0, int(wait_ms))))
+
+    @property
+    def in_waiting(self):
+        if self._connect() is None or not self._poller.poll(0):
+            return 0
+        return self.RX_HINT
+
+    def readinto(self, buf):
+        sock = self._connect()
+        if sock is None:
+            self._idle(1000 if self.timeout is None else self.timeout * 1000)
+            return 0
+        sock.settimeout(self.timeout)
+        try:
+            readinto = getattr(sock, "readinto", None) or sock.recv_into  # MicroPython / CPython
+            n = readinto(buf)
+        except OSError as exc:
+            if _timed_out(exc):
+                return 0
+            self._drop(exc)
+            return 0
+        if not n:
+            self._drop("closed by bridge")
+            return 0
+        self._data(n)
+        return n
+
+    def read(self, n=1):
+        buf = bytearray(n)
+        got = self.readinto(buf)
+        return bytes(buf[:got])
+
+    def write(self, data):
+        sock = self._connect()
+        if sock is None:
+            return 0
+        try:
+            sock.settimeout(self.timeout)
+            sock.sendall(data)
+        except OSError as exc:
+            self._drop(exc)
+            return 0
+        return len(data)
+
+    def reset_input_buffer(self):
+        '''
+            Throw away what has already arrived, without waiting for more
+        '''
+        if self._sock is None:
+            return
+        buf = bytearray(256)
+        waiting = self.RX_HINT
+        while waiting > 0 and self._sock is not None and self._poller.poll(0):
+            n = self.readinto(buf)
+            if not n:
+                break
+            waiting -= n
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            self.connected = False
+
+
+class TCPLink(_Health):
+    '''
+        asyncio TCP connection that awaits on_chunk with every chunk it reads and
+        reconnects with backoff when the bridge goes away
+    '''
+
+    RX_CHUNK = const(256)
+
+    def __init__(self, host, port, retry_min=_Health.RETRY_MIN, retry_max=_Health.RETRY_MAX):
+        super().__init__(host, port, retry_min, retry_max)
+        self._writer = None
+
+    def write(self, data):
+        '''
+            Queue bytes for the bridge; dropped while disconnected
+        '''
+        if self._writer is None:
+            return 0
+        self._writer.write(data)
+        asyncio.create_task(self._writer.drain())
+        return len(data)
+
+    async def run(self, on_chunk):
+        buf = bytearray(self.RX_CHUNK) # One buffer, reused for every read
+        mv = memoryview(buf)
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as exc:
+                await asyncio.sleep(self._down(exc) / 1000)
+                continue
+            self._up()
+            readinto = getattr(reader, "readinto", None) # MicroPython only
+            error = "closed by bridge"
+            try:
+                while True:
+                    if readinto is not None:
+                        n = await readinto(buf)
+                        chunk = mv[:n]
+                    else:
+                        chunk = await reader.read(self.RX_CHUNK)
+                        n = len(chunk)
+                    if not n:
+                        break
+                    self._data(n)
+                    await on_chunk(chunk)
+                    await asyncio.sleep(0) # Let the other links have a turn
+            except OSError as exc:
+                error = exc
+            writer, self._writer = self._writer, None
+            writer.close()
+            await asyncio.sleep(self._down(error) / 1000)
+
+
+class VEDirectTCPPool(VEDirectHub):
+    '''
+        VEDirectHub over TCP bridges: one reconnecting link and parser per bridge
+    '''
+
+    def __init__(self, bridges, callback=None, queue=8, compact=False,
+                 retry_min=_Health.RETRY_MIN, retry_max=_Health.RETRY_MAX):
+        self._retry = (retry_min, retry_max)
+        super().__init__(bridges, callback, queue, compact)
+
+    def _open(self, name, bridge):
+        host, port = parse_url(bridge) if isinstance(bridge, str) else bridge
+        log.info("Bridge %s at %s:%d", name, host, port)
+        return TCPLink(host, port, *self._retry)
+
+    def link(self, name):
+        '''
+            Return the TCPLink for a bridge, e.g. for its write()
+        '''
+        return self._port(name).stream
+
+    def stats(self):
+        result = super().stats()
+        for port in self._ports:
+            result[port.name]["link"] = port.stream.health()
+        return result
+
+    async def _go(self, port):
+        parser = port.parser
+
+        async def on_chunk(chunk):
+            for record in parser.feed(chunk):
+                self._deliver(port, record)
+
+        await port.stream.run(on_chunk)
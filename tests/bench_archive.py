@@ -0,0 +1,76 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Scaling of parse_archive() with the number of worker processes (CPython).
+# Speed-up is against workers=1, which replays the same chunks in this process.
+# "records" brings every record back to this process; "handler" reduces each
+# chunk in its worker and only brings back the result.
+#
+# python bench_archive.py [--records 400000] [--chunk-mb 8] [--workers 1 2 4 8]
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from vedirect.vedirect_archive import parse_archive
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+def soc_range(records):
+    # Reduced in the worker: only two numbers per chunk come back
+    low = high = None
+    n = 0
+    for record in records:
+        soc = int(record["SOC"])
+        low = soc if low is None else min(low, soc)
+        high = soc if high is None else max(high, soc)
+        n += 1
+    return n, low, high
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel archive parsing throughput")
+    parser.add_argument("--records", default=400000, type=int)
+    parser.add_argument("--chunk-mb", default=8, type=float)
+    parser.add_argument("--workers", default=None, type=int, nargs="+",
+                        help="default: 1, 2, 4 ... up to the number of cores")
+    parser.add_argument("--offsets", action="store_true", help="block spans instead of records")
+    args = parser.parse_args()
+    workers = args.workers
+    if workers is None:
+        workers = [1]
+        while workers[-1] * 2 <= (os.cpu_count() or 1):
+            workers.append(workers[-1] * 2)
+    # The emulator turns on DEBUG logging at import; measure without log output
+    logging.getLogger().setLevel(logging.CRITICAL)
+    emu = VEDirectDeviceEmulator("", model="BMV_700", seed=1)
+    record = emu.get_bytes()
+    fd, path = tempfile.mkstemp(suffix=".bin")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for _ in range(args.records // 1000):
+                f.write(record * 1000)
+        size = os.path.getsize(path)
+        print("capture {:.1f} MB, {} cores".format(size / 1e6, os.cpu_count()))
+        chunk_size = int(args.chunk_mb * 1e6)
+        modes = {
+            "records": lambda n: sum(1 for _ in parse_archive(path, n, chunk_size, offsets=args.offsets)),
+            "handler": lambda n: sum(r[0] for r in parse_archive(path, n, chunk_size, handler=soc_range)),
+        }
+        for mode, run in modes.items():
+            base = None
+            for n in workers:
+                start = time.perf_counter()
+                count = run(n)
+                elapsed = time.perf_counter() - start
+                base = base or elapsed
+                print("{:>8} {:>3} workers: {:>8} records {:>9.0f} records/s {:>7.1f} MB/s  x{:.2f}".format(
+                    mode, n, count, count / elapsed, size / elapsed / 1e6, base / elapsed))
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# VEDirectColumns: append rate, and .npz / Parquet save and load times for a
+# month of 1 Hz BMV_700 records (CPython, numpy; pyarrow for Parquet).
+#
+# python bench_columns.py [--records 2592000]
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from vedirect.vedirect_base import VEDirectBase
+from vedirect.vedirect_columns import VEDirectColumns
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+def timed(label, run):
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    print("{:>14}: {:7.2f} s".format(label, elapsed))
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar sink throughput")
+    parser.add_argument("--records", default=30 * 24 * 3600, type=int)
+    args = parser.parse_args()
+    # The emulator turns on DEBUG logging at import; measure without log output
+    logging.getLogger().setLevel(logging.CRITICAL)
+    emu = VEDirectDeviceEmulator("", model="BMV_700", seed=1)
+    sample = [VEDirectBase.typecast(emu.get_record()) for _ in range(1000)]
+    cols = VEDirectColumns()
+
+    def fill():
+        for i in range(args.records):
+            cols.append(sample[i % 1000], t=float(i))
+
+    _, elapsed = timed("append", fill)
+    print("{:>14}  {:7.0f} records/s".format("", args.records / elapsed))
+    tmp = tempfile.mkdtemp()
+    npz = os.path.join(tmp, "month.npz")
+    timed("save .npz", lambda: cols.save_npz(npz))
+    loaded, _ = timed("load .npz", lambda: VEDirectColumns.load_npz(npz))
+    timed("mean V", lambda: loaded.column("V").mean())
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        pyarrow = None
+    if pyarrow is not None:
+        pq = os.path.join(tmp, "month.parquet")
+        timed("save Parquet", lambda: cols.to_parquet(pq))
+        timed("load Parquet", lambda: pyarrow.parquet.read_table(pq))
+        os.remove(pq)
+    print("{} records, {} columns, {:.0f} MB on disk as .npz".format(
+        len(loaded), len(loaded.keys()), os.path.getsize(npz) / 1e6))
+    os.remove(npz)
+    os.rmdir(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Scaling of VEDirectGateway (CPython, selectors) with the number of ports.
+# Each port is a pty pair; a writer thread plays one emulated device per pty,
+# sending one record per device every 1/rate seconds, as a real device does at 1 Hz.
+# The gateway thread's CPU time is reported per device and per record.
+#
+# python bench_gateway.py [--ports 1 10 100 500] [--seconds 5] [--rate 1]
+
+import argparse
+import logging
+import os
+import resource
+import threading
+import time
+
+from vedirect.vedirect_gateway import VEDirectGateway
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+def writer(masters, record, period, stop):
+    due = time.monotonic()
+    while not stop.is_set():
+        for fd in masters:
+            os.write(fd, record)
+        due += period
+        delay = due - time.monotonic()
+        if delay > 0:
+            stop.wait(delay)
+
+
+def run(ports, seconds, rate, record):
+    gw = VEDirectGateway()
+    masters = []
+    for i in range(ports):
+        master, slave = os.openpty()
+        masters.append(master)
+        gw.add("pty{}".format(i), os.ttyname(slave))
+        os.close(slave)
+    stop = threading.Event()
+    thread = threading.Thread(target=writer, args=(masters, record, 1.0 / rate, stop), daemon=True)
+    thread.start()
+    records = 0
+    cpu = time.thread_time()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        records += len(gw.poll(0.1))
+    cpu = time.thread_time() - cpu
+    stop.set()
+    thread.join()
+    gw.close()
+    for fd in masters:
+        os.close(fd)
+    return records, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VEDirectGateway scaling")
+    parser.add_argument("--ports", default=[1, 10, 100, 500], type=int, nargs="+")
+    parser.add_argument("--seconds", default=5.0, type=float)
+    parser.add_argument("--rate", default=1.0, type=float, help="records per second per device")
+    args = parser.parse_args()
+    # Each port needs the pty master plus the gateway's descriptor
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    want = min(hard, 2 * max(args.ports) + 64)
+    if soft < want:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (want, hard))
+    record = VEDirectDeviceEmulator("", model="BMV_700").get_bytes()
+    # The emulator turns on DEBUG logging at import; measure without log output
+    logging.getLogger().setLevel(logging.CRITICAL)
+    for ports in args.ports:
+        records, cpu = run(ports, args.seconds, args.rate, record)
+        print("{:>4} ports: {:7d} records, CPU {:5.1f}% total, {:6.3f}% per device, {:5.1f} us per record".format(
+            ports, records, 100 * cpu / args.seconds, 100 * cpu / args.seconds / ports,
+            1e6 * cpu / records if records else 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Throughput of the VEDirectBase parser on an emulated BMV_700 stream.
+#
+# python bench_parser.py [--records 2000] [--chunk 64] [--errors 0.1]
+
+import argparse
+import logging
+import time
+
+from vedirect.vedirect_base import VEDirectBase
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+def bench(stream, chunk, repeat=3):
+    best = None
+    for _ in range(repeat):
+        parser = VEDirectBase()
+        n = 0
+        start = time.perf_counter()
+        for i in range(0, len(stream), chunk):
+            for _ in parser.feed(stream[i:i + chunk]):
+                n += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return n, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VE.Direct parser throughput")
+    parser.add_argument("--records", default=2000, type=int)
+    parser.add_argument("--chunk", default=64, type=int)
+    parser.add_argument("--model", default="BMV_700", type=str)
+    parser.add_argument("--errors", default=0.0, type=float,
+                        help="fraction of records damaged by the emulator")
+    args = parser.parse_args()
+    # The emulator turns on DEBUG logging at import; measure without log output
+    logging.getLogger().setLevel(logging.CRITICAL)
+    emu = VEDirectDeviceEmulator("", model=args.model, errors=args.errors, seed=1)
+    stream = b"".join(emu.get_bytes() for _ in range(args.records))
+    for chunk in (1, args.chunk, len(stream)):
+        n, elapsed = bench(stream, chunk)
+        print("chunk {:>8}: {:>9.0f} records/s {:>7.2f} MB/s".format(
+            chunk, n / elapsed, len(stream) / elapsed / 1e6))
+    if args.errors:
+        parser = VEDirectBase()
+        n = sum(1 for _ in parser.feed(stream))
+        print("recovered {} of {} records, {}".format(n, args.records, parser.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Replay speed of VEDirectReplay on a capture file, against feeding the same
+# bytes through the VEDirectBase parser (CPython).
+#
+# python bench_replay.py [--records 100000] [--errors 0.0] [--file capture.bin]
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from vedirect.vedirect_base import VEDirectBase
+from vedirect.vedirect_replay import VEDirectReplay
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+def timed(label, size, run):
+    start = time.perf_counter()
+    n = run()
+    elapsed = time.perf_counter() - start
+    print("{:>10}: {:>8} records {:>9.0f} records/s {:>8.1f} MB/s".format(
+        label, n, n / elapsed, size / elapsed / 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture replay throughput")
+    parser.add_argument("--records", default=100000, type=int)
+    parser.add_argument("--model", default="BMV_700", type=str)
+    parser.add_argument("--errors", default=0.0, type=float,
+                        help="fraction of records damaged by the emulator")
+    parser.add_argument("--file", default=None, help="replay this capture instead of an emulated one")
+    args = parser.parse_args()
+    # The emulator turns on DEBUG logging at import; measure without log output
+    logging.getLogger().setLevel(logging.CRITICAL)
+    path = args.file
+    if path is None:
+        emu = VEDirectDeviceEmulator("", model=args.model, errors=args.errors, seed=1)
+        fd, path = tempfile.mkstemp(suffix=".bin")
+        with os.fdopen(fd, "wb") as f:
+            for _ in range(args.records):
+                f.write(emu.get_bytes())
+    size = os.path.getsize(path)
+    print("capture {:.1f} MB".format(size / 1e6))
+    try:
+        with VEDirectReplay(path) as replay:
+            timed("offsets", size, lambda: sum(1 for _ in replay.offsets()))
+        with VEDirectReplay(path) as replay:
+            timed("records", size, lambda: sum(1 for _ in replay.records()))
+        with VEDirectReplay(path, compact=True) as replay:
+            timed("compact", size, lambda: sum(1 for _ in replay.records()))
+        with open(path, "rb") as f:
+            data = f.read()
+        timed("feed()", size, lambda: sum(1 for _ in VEDirectBase().feed(data)))
+    finally:
+        if args.file is None:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
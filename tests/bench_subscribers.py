@@ -0,0 +1,107 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# VEDirectAsyncio.records(): delivery latency (from the checksum byte reaching
+# the reader to the record reaching each subscriber) and CPU per record, for
+# 1, 5 and 20 subscribers iterating with async for (CPython asyncio).
+#
+# python bench_subscribers.py [--records 2000] [--interval 1]
+
+import argparse
+import asyncio
+import logging
+import time
+
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+class FeedReader:
+    """Stands in for asyncio.StreamReader: hands out whatever the feed has sent"""
+
+    def __init__(self, uart):
+        self.uart = uart
+
+    async def readinto(self, buf):
+        uart = self.uart
+        while not uart.chunks:
+            uart.ready.clear()
+            await uart.ready.wait()
+        chunk = uart.chunks.pop(0)
+        buf[:len(chunk)] = chunk
+        return len(chunk)
+
+
+class FeedUart:
+    def __init__(self):
+        self.chunks = []
+        self.ready = asyncio.Event()
+
+    def init(self, **kwargs):
+        pass
+
+    def send(self, data):
+        # Up to 256 bytes per read, as VEDirectAsyncio asks for
+        for i in range(0, len(data), 256):
+            self.chunks.append(data[i:i + 256])
+        self.ready.set()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(consumers, blocks, interval):
+    from vedirect.vedirect_asyncio import VEDirectAsyncio
+    uart = FeedUart()
+    ve = VEDirectAsyncio(uart)
+    sent = [0.0] * len(blocks)
+    latencies = []
+
+    async def consume(sub):
+        async with sub:
+            n = 0
+            async for record in sub:
+                latencies.append(time.perf_counter() - sent[int(record["H1"])])
+                n += 1
+                if n == len(blocks):
+                    break
+
+    tasks = [asyncio.ensure_future(consume(ve.records(queue=len(blocks)))) for _ in range(consumers)]
+    await asyncio.sleep(0)
+    cpu = time.process_time()
+    for i, block in enumerate(blocks):
+        sent[i] = time.perf_counter()
+        uart.send(block)
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+    cpu = time.process_time() - cpu
+    ve._run.cancel()
+    return latencies, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Subscriber delivery latency and CPU")
+    parser.add_argument("--records", default=2000, type=int)
+    parser.add_argument("--interval", default=1, type=float, help="ms between records")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.CRITICAL)
+    asyncio.StreamReader = FeedReader  # VEDirectAsyncio wraps its UART in one
+    emu = VEDirectDeviceEmulator("", model="BMV_700", seed=1)
+    blocks = []
+    for i in range(args.records):
+        record = emu.get_record()
+        record["H1"] = str(i)  # Sequence number, to find when it was sent
+        blocks.append(bytes(emu.record_to_bytes(record)))
+    print("{:>11}  {:>9}  {:>9}  {:>14}  {:>17}".format(
+        "subscribers", "p50 us", "p99 us", "CPU us/record", "CPU us/delivery"))
+    for consumers in (1, 5, 20):
+        latencies, cpu = asyncio.run(run(consumers, blocks, args.interval / 1000))
+        assert len(latencies) == consumers * len(blocks)
+        print("{:>11}  {:9.0f}  {:9.0f}  {:14.1f}  {:17.1f}".format(
+            consumers, percentile(latencies, 0.5) * 1e6, percentile(latencies, 0.99) * 1e6,
+            cpu / len(blocks) * 1e6, cpu / len(latencies) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
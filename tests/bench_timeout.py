@@ -0,0 +1,64 @@
+# !/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Accuracy of VEDirect.read_data_single(timeout=...) on a pty (CPython, pyserial).
+# A writer thread plays a misbehaving device: silent, trickling bytes, or garbage.
+#
+# python bench_timeout.py [--runs 5]
+
+import argparse
+import logging
+import os
+import threading
+import time
+
+from vedirect import VEDirect
+
+SCENARIOS = {
+    "silent": (b"", 0),
+    "trickle": (b"\r\nV\t12800", 0.005),
+    "garbage": (bytes(range(256)), 0.0005),
+}
+
+
+def writer(fd, pattern, gap, stop):
+    while not stop.is_set():
+        if not pattern:
+            time.sleep(0.01)
+            continue
+        for i in range(len(pattern)):
+            os.write(fd, pattern[i:i + 1])
+            if gap:
+                time.sleep(gap)
+            if stop.is_set():
+                break
+
+
+def main():
+    parser = argparse.ArgumentParser(description="read_data_single timeout accuracy")
+    parser.add_argument("--runs", default=5, type=int)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.CRITICAL)
+    for name, (pattern, gap) in SCENARIOS.items():
+        master, slave = os.openpty()
+        stop = threading.Event()
+        thread = threading.Thread(target=writer, args=(master, pattern, gap, stop), daemon=True)
+        thread.start()
+        ve = VEDirect(os.ttyname(slave), timeout=60)
+        for timeout in (50, 200, 1000):
+            overshoot = []
+            for _ in range(args.runs):
+                start = time.monotonic()
+                assert ve.read_data_single(timeout=timeout) is None
+                overshoot.append((time.monotonic() - start) * 1000 - timeout)
+            print("{:>8} timeout {:>5} ms: overshoot mean {:6.1f} ms, max {:6.1f} ms".format(
+                name, timeout, sum(overshoot) / len(overshoot), max(overshoot)))
+        stop.set()
+        thread.join()
+        ve.ser.close()
+        os.close(master)
+        os.close(slave)
+
+
+if __name__ == "__main__":
+    main()
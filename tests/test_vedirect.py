@@ -1,3 +1,6 @@
+import time
+
+import pytest
 from vedirect import VEDirect
 from vedirect_device_emulator import VEDirectDeviceEmulator
 
@@ -15,3 +18,79 @@ def test_basic(fake_serial):
     res = ve.read_data_single()
 
     assert record == res
+
+
+class ChunkSerial:
+    """Serial port stand-in that counts read calls"""
+
+    def __init__(self, data):
+        self.data = data
+        self.reads = 0
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def readinto(self, buf):
+        self.reads += 1
+        n = min(len(buf), len(self.data))
+        buf[:n] = self.data[:n]
+        self.data = self.data[n:]
+        return n
+
+
+def test_read_queues_every_record_in_chunk():
+    emu = VEDirectDeviceEmulator("", model="MPPT")
+    port = ChunkSerial(emu.get_bytes() * 3)
+    ve = VEDirect(port)
+    record = VEDirect.typecast(emu.get_record())
+    assert [ve.read(), ve.read(), ve.read()] == [record] * 3
+    assert ve.read() is None
+    assert port.reads == 2  # 1140 bytes in RX_CHUNK pieces, not one call per byte
+
+
+def test_read_data_single_bulk():
+    emu = VEDirectDeviceEmulator("", model="BMV_700")
+    port = ChunkSerial(emu.get_bytes() * 2)
+    ve = VEDirect(port)
+    assert ve.read_data_single(flush=False) == VEDirect.typecast(emu.get_record())
+    assert ve.read_data_single(flush=False) == VEDirect.typecast(emu.get_record())
+    assert port.reads == 2
+
+
+class SlowSerial(ChunkSerial):
+    """pyserial stand-in: a byte every `gap` seconds, reads block up to `timeout`"""
+
+    def __init__(self, data, gap):
+        super().__init__(data)
+        self.gap = gap
+        self.timeout = 60
+        self.ready = time.monotonic() + gap
+
+    @property
+    def in_waiting(self):
+        return 1 if self.data and time.monotonic() >= self.ready else 0
+
+    def readinto(self, buf):
+        wait = self.ready - time.monotonic() if self.data else self.timeout
+        if wait > self.timeout:
+            time.sleep(self.timeout)
+            return 0
+        time.sleep(max(wait, 0))
+        self.ready = time.monotonic() + self.gap
+        return super().readinto(buf[:1])
+
+
+@pytest.mark.parametrize("data, gap", [
+    (b"", 0),  # unplugged
+    (b"\r\nV\t12800" * 1000, 0.005),  # trickling in
+    (bytes(range(256)) * 1000, 0),  # garbage, as fast as it comes
+])
+def test_read_data_single_timeout(monkeypatch, data, gap):
+    monkeypatch.setattr("vedirect.vedirect.MICROPYTHON", False)
+    port = SlowSerial(data, gap)
+    ve = VEDirect(port)
+    start = time.monotonic()
+    assert ve.read_data_single(timeout=200) is None
+    assert 0.19 <= time.monotonic() - start < 0.3
+    assert port.timeout == 60  # the port's own timeout is put back
@@ -0,0 +1,43 @@
+from vedirect.vedirect_base import VEDirectBase
+from vedirect.vedirect_archive import parse_archive, split_points
+from vedirect.vedirect_replay import VEDirectReplay
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+def test_parallel_matches_sequential(tmp_path):
+    emu = VEDirectDeviceEmulator("", model="ALL", errors=0.2, seed=5)
+    path = tmp_path / "capture.bin"
+    path.write_bytes(b"".join(emu.get_bytes() for _ in range(300)))
+    with VEDirectReplay(str(path)) as replay:
+        expected = list(replay.records())
+        spans = list(replay.offsets())
+        expected_stats = replay.stats()
+    chunks = split_points(str(path), 5000)
+    assert len(chunks) > 10
+    assert chunks[0][0] == 0 and chunks[-1][1] == path.stat().st_size
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    stats = {}
+    assert list(parse_archive(str(path), workers=2, chunk_size=5000, stats=stats)) == expected
+    assert stats["records"] == expected_stats["records"]
+    assert list(parse_archive(str(path), workers=2, chunk_size=5000, offsets=True)) == spans
+    compact = list(parse_archive(str(path), workers=2, chunk_size=5000, compact=True))
+    assert compact == [VEDirectBase.typecast(record) for record in expected]
+
+
+def count_pids(records):
+    counts = {}
+    for record in records:
+        counts[record["PID"]] = counts.get(record["PID"], 0) + 1
+    return counts
+
+
+def test_handler_runs_in_workers(tmp_path):
+    emu = VEDirectDeviceEmulator("", model="ALL")
+    path = tmp_path / "capture.bin"
+    path.write_bytes(b"".join(emu.get_bytes() for _ in range(200)))
+    totals = {}
+    for counts in parse_archive(str(path), workers=2, chunk_size=4000, handler=count_pids):
+        for pid, n in counts.items():
+            totals[pid] = totals.get(pid, 0) + n
+    with VEDirectReplay(str(path)) as replay:
+        assert totals == count_pids(replay.records())
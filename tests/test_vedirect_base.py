@@ -0,0 +1,193 @@
+from vedirect.vedirect_base import VEDirectBase
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+def test_feed_chunks():
+    emu = VEDirectDeviceEmulator("", model="BMV_700")
+    resp = emu.get_bytes()
+    stream = resp * 3
+    # Whole stream, byte at a time and awkward chunk sizes must all agree
+    for size in (len(stream), 1, 7, 64):
+        parser = VEDirectBase()
+        records = []
+        for i in range(0, len(stream), size):
+            records.extend(parser.feed(memoryview(stream)[i:i + size]))
+        assert records == [emu.get_record()] * 3
+
+
+def test_input_single_byte():
+    emu = VEDirectDeviceEmulator("", model="MPPT")
+    parser = VEDirectBase()
+    records = [r for r in (parser._input(bytes([b])) for b in emu.get_bytes()) if r]
+    assert records == [emu.get_record()]
+
+
+def test_field_buffers_do_not_grow():
+    import tracemalloc
+
+    parser = VEDirectBase()
+    key, value = parser._key, parser._value
+    list(parser.feed(b"\r\nSER#\t"))
+    chunks = [bytes([b]) for b in b"HQ1411123456789012345678901234"]
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for chunk in chunks:
+            for _ in parser.feed(chunk):
+                pass
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    # Steady state: every byte lands in the preallocated buffers
+    only_parser = [tracemalloc.Filter(True, VEDirectBase.feed.__code__.co_filename)]
+    growth = after.filter_traces(only_parser).compare_to(
+        before.filter_traces(only_parser), "filename")
+    assert sum(stat.size_diff for stat in growth) <= 0
+    assert parser._key is key and parser._value is value
+    assert parser._valuelen == len(chunks)
+    list(parser.feed(b"\r\n"))
+    assert parser.dict == {"SER#": "HQ1411123456789012345678901234"}
+
+
+def test_overlong_field_drops_record():
+    emu = VEDirectDeviceEmulator("", model="MPPT")
+    parser = VEDirectBase()
+    bad = b"\r\nSER#\t" + b"X" * (VEDirectBase.VALUE_MAX + 1)
+    assert list(parser.feed(bad + emu.get_bytes())) == [emu.get_record()]
+
+
+def test_trace_hook():
+    emu = VEDirectDeviceEmulator("", model="BMV_700")
+    stream = emu.get_bytes() + b":A0102000543\n" + emu.get_bytes()
+    traced = []
+    parser = VEDirectBase()
+    parser.set_trace(lambda state, data: traced.append((state, bytes(data))))
+    for i in range(0, len(stream), 16):
+        list(parser.feed(stream[i:i + 16]))
+    # Every input byte is reported exactly once, in order
+    assert b"".join(data for _, data in traced) == stream
+    assert b"".join(data for state, data in traced if state == VEDirectBase.HEX) == b"A0102000543\n"
+    parser.set_trace()
+    traced.clear()
+    list(parser.feed(stream))
+    assert traced == []
+
+
+def test_typecast_plan(caplog):
+    VEDirectBase.plans.clear()
+    emu = VEDirectDeviceEmulator("", model="ALL")
+    record = emu.get_record()
+    first = VEDirectBase.typecast(record)
+    plan = VEDirectBase.plans[record["PID"]]
+    # V2/V3 have no type: reported once when the plan is built, then dropped quietly
+    assert "V2" not in first and first["V"] == 12800
+    assert len([r for r in caplog.records if "unknown VE keys" in r.getMessage()]) == 1
+    assert VEDirectBase.typecast(record) == first
+    assert VEDirectBase.plans[record["PID"]] is plan
+    assert len([r for r in caplog.records if "unknown VE keys" in r.getMessage()]) == 1
+    # A changed key set invalidates the plan
+    fewer = dict(record)
+    del fewer["V"]
+    assert "V" not in VEDirectBase.typecast(fewer)
+    assert VEDirectBase.plans[record["PID"]] is not plan
+
+
+def test_compact_records():
+    import sys
+
+    emu = VEDirectDeviceEmulator("", model="BMV_700")
+    parser = VEDirectBase(compact=True)
+    first, second = parser.feed(emu.get_bytes() * 2)
+    expected = VEDirectBase.typecast(emu.get_record())
+    assert first == expected and second == expected
+    assert first["V"] == 12800 and first.get("VPV") is None and "SOC" in first
+    assert dict(first.items()) == expected and list(first) == list(expected)
+    # Key metadata is shared, each record only carries its values
+    assert first.profile is second.profile
+    assert sys.getsizeof(first) + sys.getsizeof(first.values) < sys.getsizeof(expected) / 2
+
+
+def test_interned_keys():
+    emu = VEDirectDeviceEmulator("", model="MPPT")
+    first, second = VEDirectBase().feed(emu.get_bytes() * 2)
+    other, = VEDirectBase().feed(emu.get_bytes())
+    for a, b, c in zip(first, second, other):
+        assert a is b is c
+    # Garbage keys cannot grow the table without bound
+    parser = VEDirectBase()
+    for i in range(VEDirectBase.INTERNED_MAX * 3):
+        list(parser.feed("\r\nK{}\t1".format(i).encode()))
+    assert len(VEDirectBase.interned) <= VEDirectBase.INTERNED_MAX
+
+
+def test_checksum_error_counted():
+    emu = VEDirectDeviceEmulator("", model="MPPT")
+    good = emu.get_bytes()
+    bad = bytearray(good)
+    bad[5] ^= 0x01
+    parser = VEDirectBase()
+    assert list(parser.feed(bytes(bad) + good)) == [emu.get_record()]
+    assert parser.checksum_errors == 1
+    assert parser.bytes_discarded == len(bad)
+    assert parser.records_in == 1 and parser.bytes_in == 2 * len(good)
+
+
+def test_resync_salvages_next_block():
+    emu = VEDirectDeviceEmulator("", model="BMV_700")
+    good = emu.get_bytes()
+    # Lost "Checksum" label: the next block must not be swallowed with it
+    lost_label = good.replace(b"Checksum", b"Checksun")
+    # Lost tab: a key runs into the next line
+    lost_tab = good.replace(b"SOC\t", b"SOC", 1)
+    for damaged in (lost_label, lost_tab):
+        parser = VEDirectBase()
+        assert list(parser.feed(good + damaged + good)) == [emu.get_record()] * 2
+        assert parser.checksum_errors + parser.resyncs >= 1
+        assert parser.bytes_discarded >= len(damaged) - 1
+
+
+def test_resync_under_noise():
+    emu = VEDirectDeviceEmulator("", model="MPPT", errors=0.2, seed=7)
+    stream = b"".join(emu.get_bytes() for _ in range(500))
+    parser = VEDirectBase()
+    records = list(parser.feed(stream))
+    # Damaged blocks are dropped, never delivered half-right, and clean ones survive
+    assert all(record == emu.get_record() for record in records)
+    assert len(records) >= 500 * 0.75
+    assert parser.records_in == len(records)
+
+
+def test_hex_frames_interleaved():
+    from vedirect.vedirect_hex import ASYNC, PING_RESPONSE
+
+    emu = VEDirectDeviceEmulator("", model="MPPT")
+    good = emu.get_bytes()
+    # Async frames dropped into the middle of a key, a value and between blocks
+    stream = (good.replace(b"VPV", b"VP:A0102000543\nV", 1)
+              .replace(b"12800", b"128:A0102000543\n00", 1)
+              + b":51641F9\n" + good)
+    parser = VEDirectBase()
+    records = []
+    for i in range(0, len(stream), 5):
+        records.extend(parser.feed(stream[i:i + 5]))
+    assert records == [emu.get_record()] * 2
+    assert parser.checksum_errors == 0 and parser.hex_frames == 3
+    state = parser.get_hex()
+    assert state.command == ASYNC and state.register == 0x0201 and state.value == 5
+    assert parser.get_hex().name == "deviceState"
+    ping = parser.get_hex()
+    assert ping.command == PING_RESPONSE and ping.raw == 0x4116
+    assert parser.get_hex() is None
+    # A corrupt frame is counted and dropped; the text around it still parses
+    seen = []
+    parser.set_hex_handler(seen.append)
+    assert list(parser.feed(b":A0102000544\n" + good)) == [emu.get_record()]
+    assert parser.hex_errors == 1 and seen == []
+
+
+def test_overlong_hex_frame():
+    emu = VEDirectDeviceEmulator("", model="MPPT")
+    parser = VEDirectBase()
+    frame = b":" + b"A" * (VEDirectBase.HEX_MAX + 10) + b"\n"
+    assert list(parser.feed(frame + emu.get_bytes())) == [emu.get_record()]
+    assert parser.hex_errors == 1
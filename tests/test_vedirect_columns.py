@@ -0,0 +1,48 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from vedirect.vedirect_base import VEDirectBase
+from vedirect.vedirect_columns import VEDirectColumns
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+def records(model, n, cast=VEDirectBase.typecast):
+    emu = VEDirectDeviceEmulator("", model=model)
+    return [cast(emu.get_record()) for _ in range(n)]
+
+
+def test_columns_grow_and_mask(tmp_path):
+    bmv = records("BMV_700", 5)
+    mppt = records("MPPT", 5, VEDirectBase.typecast_compact)
+    cols = VEDirectColumns(capacity=2)
+    for i, (a, b) in enumerate(zip(bmv, mppt)):
+        cols.append(a, t=1000.0 + i)
+        cols.append(b)
+    assert len(cols) == 10 and cols.capacity == 16
+    soc = cols.column("SOC")
+    assert soc.dtype == numpy.int64 and cols.unit("SOC") == "%"
+    assert soc.mask.tolist() == [False, True] * 5
+    assert soc.compressed().tolist() == [r["SOC"] for r in bmv]
+    assert cols.column("PPV").compressed().tolist() == [r["PPV"] for r in mppt]
+    assert cols.column("PID")[1] == mppt[0]["PID"]
+    assert cols.column("time").count() == 5
+
+    path = tmp_path / "day.npz"
+    cols.save_npz(path)
+    loaded = VEDirectColumns.load_npz(path)
+    assert len(loaded) == 10 and sorted(loaded.keys()) == sorted(cols.keys())
+    assert (loaded.column("V") == cols.column("V")).all()
+    assert loaded.column("SOC").mask.tolist() == soc.mask.tolist()
+
+
+def test_parquet_export(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    cols = VEDirectColumns()
+    cols.extend(records("BMV_700", 3) + records("MPPT", 2))
+    path = tmp_path / "day.parquet"
+    cols.to_parquet(path)
+    table = pq.read_table(path)
+    assert table.num_rows == 5
+    assert table.column("SOC").null_count == 2
+    assert table.schema.field("V").metadata[b"unit"] == b"mV"
@@ -0,0 +1,73 @@
+
+import asyncio
+import time
+
+from vedirect.vedirect_dispatch import CallbackDispatcher
+from vedirect_device_emulator import VEDirectDeviceEmulator
+from test_vedirect_queue import FakeReader, FakeUart
+
+
+def records(n):
+    emu = VEDirectDeviceEmulator("", model="BMV_700")
+    chunks = []
+    expected = []
+    for i in range(n):
+        record = emu.get_record()
+        record["H1"] = str(-i)
+        chunks.append(bytes(emu.record_to_bytes(record)))
+        expected.append(dict(record))
+    return chunks, expected
+
+
+def test_slow_callback_leaves_the_read_loop_alone(monkeypatch):
+    monkeypatch.setattr(asyncio, "StreamReader", FakeReader)
+    from vedirect.vedirect_asyncio import VEDirectAsyncio
+    chunks, expected = records(4)
+    uart = FakeUart(b"".join(chunks))
+    seen = []
+
+    def slow(record):
+        time.sleep(0.1)  # Blocks, like a publish to a broker that's slow to answer
+        seen.append(record)
+
+    async def run():
+        ve = VEDirectAsyncio(uart, callback=slow)
+        await asyncio.sleep(0.02)
+        parsed = ve.stats()["records"]
+        while len(seen) < 4:
+            await asyncio.sleep(0.02)
+        ve._run.cancel()
+        return parsed, ve.stats()
+
+    parsed, stats = asyncio.run(run())
+    assert parsed == 4  # All parsed while the first callback was still sleeping
+    assert seen == expected
+    assert stats["read_loop"]["delays"] == 0 and stats["read_loop"]["max_ms"] < 50
+    assert stats["callback"]["calls"] == 4 and stats["callback"]["latency_us_max"] >= 400000
+
+
+def test_async_callbacks_and_errors():
+    seen = []
+
+    async def callback(n):
+        await asyncio.sleep(0.001)
+        if n == 2:
+            raise ValueError("bad record")
+        seen.append(n)
+
+    async def run():
+        dispatch = CallbackDispatcher(callback, queue=2, executor=False)
+        for n in range(4):
+            assert dispatch.submit(n)
+        await asyncio.sleep(0)
+        assert dispatch.submit(4)
+        while dispatch.stats()["calls"] < 4:
+            await asyncio.sleep(0.001)
+        dispatch.close()
+        return dispatch.stats()
+
+    stats = asyncio.run(run())
+    # The dispatch task took 0 before 1..3 arrived; 1 was dropped for 3, then 2 for 4
+    assert seen == [0, 3, 4]
+    assert stats["errors"] == 0 or seen == [0, 3, 4]
+    assert stats["queue"]["dropped"] == 2
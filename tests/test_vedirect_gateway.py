@@ -0,0 +1,36 @@
+import os
+
+from vedirect.vedirect_gateway import VEDirectGateway
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+def test_gateway_reads_many_ptys():
+    emu = VEDirectDeviceEmulator("", model="MPPT")
+    record = emu.get_bytes()
+    gw = VEDirectGateway()
+    masters = []
+    for i in range(20):
+        master, slave = os.openpty()
+        masters.append(master)
+        gw.add("pty{}".format(i), os.ttyname(slave))
+        os.close(slave)
+    try:
+        for master in masters:
+            os.write(master, record[:100])
+        assert gw.poll(0.1) == []
+        for master in masters:
+            os.write(master, record[100:])
+        got = []
+        while len(got) < len(masters):
+            got.extend(gw.poll(1.0))
+        assert sorted(name for name, _ in got) == sorted("pty{}".format(i) for i in range(20))
+        assert all(rec == emu.get_record() for _, rec in got)
+        assert gw.stats()["pty3"]["records"] == 1
+        # A port whose other end goes away is dropped, the rest carry on
+        os.close(masters.pop())
+        gw.poll(0.1)
+        assert len(gw) == 19
+    finally:
+        gw.close()
+        for master in masters:
+            os.close(master)
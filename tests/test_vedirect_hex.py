@@ -0,0 +1,21 @@
+import pytest
+from vedirect.vedirect_hex import (GET, PING, encode_frame, encode_register,
+                                   decode_frame)
+
+
+def test_encode_matches_protocol_examples():
+    assert encode_frame(PING) == b":154\n"
+    assert encode_register(GET, 0xEDF0) == b":7F0ED0071\n"
+
+
+def test_register_roundtrip():
+    frame = encode_register(GET, 0xEDBB, 0, bytes((0x10, 0x27)))
+    message = decode_frame(frame[1:-1])
+    assert message.register == 0xEDBB and message.flags == 0
+    assert message.name == "panelVoltage" and message.value == pytest.approx(100.0)
+
+
+def test_decode_rejects_bad_frames():
+    for frame in (b"7F0ED0072", b"7F0ED007", b"Z54", b"1"):
+        with pytest.raises(ValueError):
+            decode_frame(frame)
@@ -0,0 +1,63 @@
+from vedirect.vedirect_base import VEDirectBase
+from vedirect.vedirect_hex import GET, ASYNC, decode_frame, encode_register
+from vedirect.vedirect_hex_client import VEDirectHexClient
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+class FakeDevice(VEDirectBase):
+    """Parser whose write() collects the requests, so the test can answer them"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def write(self, data):
+        self.requests.append(decode_frame(data[1:-1]))
+
+    def answer(self, request, value=b"\x10\x27", flags=0):
+        return list(self.feed(encode_register(request.command, request.register, flags, value)))
+
+
+def test_pipelined_polling():
+    ve = FakeDevice()
+    registers = [0xEDBB, 0xEDBC, 0xEDBD, 0xEDD5, 0xEDD7]
+    seen = []
+    client = VEDirectHexClient(ve, {r: 100 for r in registers}, depth=3, rate=1000,
+                               callback=lambda register, message: seen.append(register))
+    now = 1000
+    assert client.service(now) == 3  # pipeline full
+    assert [r.register for r in ve.requests] == registers[:3]
+    assert client.service(now + 1) == 0
+    # Answers arrive out of order and are matched by register
+    ve.answer(ve.requests[2])
+    ve.answer(ve.requests[0])
+    assert seen == [0xEDBD, 0xEDBB]
+    assert client.values[0xEDBB].value == 100.0
+    assert client.service(now + 2) == 2
+    assert [r.register for r in ve.requests[3:]] == registers[3:]
+    # Register 0xEDBC never answers: it times out and is polled again later
+    assert client.service(now + 600) >= 1
+    assert client.timeouts >= 1
+    assert 0xEDBC in [r.register for r in ve.requests[5:]]
+
+
+def test_text_records_unaffected():
+    emu = VEDirectDeviceEmulator("", model="MPPT")
+    ve = FakeDevice()
+    client = VEDirectHexClient(ve, {0xEDBB: 100})
+    client.service()
+    response = encode_register(GET, 0xEDBB, 0, b"\x10\x27")
+    good = emu.get_bytes()
+    half = len(good) // 2
+    assert list(ve.feed(good[:half] + response + good[half:])) == [emu.get_record()]
+    assert client.received == 1 and 0xEDBB in client.values
+
+
+def test_flags_and_async():
+    ve = FakeDevice()
+    client = VEDirectHexClient(ve)
+    client.get(0xEDBB)
+    ve.answer(ve.requests[0], b"", flags=0x01)
+    assert client.errors == 1 and 0xEDBB not in client.values
+    list(ve.feed(encode_register(ASYNC, 0x0201, 0, b"\x05")))
+    assert client.values[0x0201].value == 5
@@ -0,0 +1,51 @@
+import asyncio
+
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+class FakeUart:
+    def __init__(self, data, chunk):
+        self.chunks = [data[i:i + chunk] for i in range(0, len(data), chunk)]
+
+    def init(self, **kwargs):
+        pass
+
+
+class FakeReader:
+    """Stands in for MicroPython's asyncio.StreamReader over a UART"""
+
+    def __init__(self, uart):
+        self.uart = uart
+
+    async def readinto(self, buf):
+        await asyncio.sleep(0)
+        while not self.uart.chunks:
+            await asyncio.sleep(1)
+        chunk = self.uart.chunks.pop(0)
+        buf[:len(chunk)] = chunk
+        return len(chunk)
+
+
+def test_hub_merges_tagged_records(monkeypatch):
+    monkeypatch.setattr(asyncio, "StreamReader", FakeReader)
+    from vedirect.vedirect_hub import VEDirectHub
+
+    models = {"mppt": "MPPT", "bmv": "BMV_700", "inverter": "PHX_INVERTER"}
+    emus = {port: VEDirectDeviceEmulator("", model=model) for port, model in models.items()}
+
+    async def run():
+        seen = []
+        hub = VEDirectHub({port: FakeUart(emu.get_bytes() * 3, 50) for port, emu in emus.items()},
+                          callback=lambda *tagged: seen.append(tagged[0]), queue=4)
+        await asyncio.sleep(0.05)
+        return hub, seen
+
+    hub, seen = asyncio.run(run())
+    assert sorted(seen) == sorted(list(models) * 3)
+    # Ports were serviced in turn, not one after the other
+    assert seen[:3] != [seen[0]] * 3
+    assert hub.stats()["hub"] == {"queued": 4, "dropped": 5}
+    port, pid, serial, record = hub.getRecord()
+    assert record == emus[port].get_record()
+    assert pid == record.get("PID") and serial == record.get("SER#")
+    assert hub.stats()["bmv"]["records"] == 3
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from vedirect.vedirect_queue import RecordQueue
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+@pytest.mark.parametrize("policy, kept, dropped, coalesced", [
+    (RecordQueue.DROP_OLDEST, [3, 4, 5], 2, 0),
+    (RecordQueue.DROP_NEWEST, [1, 2, 3], 2, 0),
+    (RecordQueue.COALESCE, [1, 2, 5], 0, 2),
+])
+def test_policies(policy, kept, dropped, coalesced):
+    q = RecordQueue(3, policy)
+    for i in range(1, 6):
+        assert q.put_nowait(i)
+    assert [q.get_nowait() for _ in range(4)] == kept + [None]
+    stats = q.stats()
+    assert stats["dropped"] == dropped and stats["coalesced"] == coalesced
+    assert stats["high_water"] == 3 and stats["queued"] == 0
+
+
+def test_block_waits_for_the_consumer():
+    async def run():
+        q = RecordQueue(2, RecordQueue.BLOCK)
+        got = []
+
+        async def producer():
+            for i in range(6):
+                await q.put(i)
+
+        async def consumer():
+            for _ in range(6):
+                got.append(await q.get())
+                await asyncio.sleep(0.001)
+
+        await asyncio.gather(producer(), consumer())
+        return got, q.stats()
+
+    got, stats = asyncio.run(run())
+    assert got == list(range(6))
+    assert stats["dropped"] == 0 and stats["blocked"] > 0 and stats["high_water"] == 2
+
+
+class FakeReader:
+    """Stands in for asyncio.StreamReader over a UART: hands out one chunk per read"""
+
+    def __init__(self, uart):
+        self.uart = uart
+
+    async def readinto(self, buf):
+        while not self.uart.chunks:
+            await asyncio.sleep(1)
+        chunk = self.uart.chunks.pop(0)
+        if len(chunk) > len(buf):
+            self.uart.chunks.insert(0, chunk[len(buf):])
+            chunk = chunk[:len(buf)]
+        buf[:len(chunk)] = chunk
+        return len(chunk)
+
+
+class FakeUart:
+    def __init__(self, data):
+        self.chunks = [data]
+
+    def init(self, **kwargs):
+        pass
+
+
+def test_asyncio_queue_keeps_order(monkeypatch):
+    monkeypatch.setattr(asyncio, "StreamReader", FakeReader)
+    from vedirect.vedirect_asyncio import VEDirectAsyncio
+
+    emu = VEDirectDeviceEmulator("", model="BMV_700")
+    data = b""
+    expected = []
+    for i in range(5):
+        record = emu.get_record()
+        record["H1"] = str(-i)
+        data += bytes(emu.record_to_bytes(record))
+        expected.append(dict(record))
+
+    async def run():
+        ve = VEDirectAsyncio(FakeUart(data), queue=3)
+        await asyncio.sleep(0.01)
+        got = [ve.getRecord() for _ in range(4)]
+        ve._run.cancel()
+        return got, ve.stats()["queue"]
+
+    got, stats = asyncio.run(run())
+    assert got == expected[2:] + [None]  # Oldest first, the two oldest dropped
+    assert stats["enqueued"] == 5 and stats["dropped"] == 2 and stats["high_water"] == 3
+
+
+def test_every_subscriber_gets_every_record(monkeypatch):
+    monkeypatch.setattr(asyncio, "StreamReader", FakeReader)
+    from vedirect.vedirect_asyncio import VEDirectAsyncio
+
+    emu = VEDirectDeviceEmulator("", model="BMV_700")
+    uart = FakeUart(b"")
+    expected = []
+    for i in range(6):
+        record = emu.get_record()
+        record["H1"] = str(-i)
+        uart.chunks.append(bytes(emu.record_to_bytes(record)))
+        expected.append(dict(record))
+
+    async def run():
+        ve = VEDirectAsyncio(uart)
+        got = {name: [] for name in ("fast", "slow", "quitter")}
+
+        async def consume(name, sub, delay, limit):
+            async with sub:
+                async for record in sub:
+                    got[name].append(record)
+                    if len(got[name]) == limit:
+                        break
+                    await asyncio.sleep(delay)
+
+        # Subscribed before the read loop first runs, so nobody misses a record
+        await asyncio.gather(consume("fast", ve.records(), 0, 6),
+                             consume("slow", ve.records(), 0.005, 6),
+                             consume("quitter", ve.records(), 0, 2))
+        ve._run.cancel()
+        return got, ve.stats()["subscribers"]
+
+    got, subscribers = asyncio.run(run())
+    assert got["fast"] == expected and got["slow"] == expected
+    assert got["quitter"] == expected[:2]
+    assert subscribers == []
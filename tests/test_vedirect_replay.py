@@ -0,0 +1,54 @@
+import pytest
+
+from vedirect.vedirect_base import VEDirectBase
+from vedirect.vedirect_replay import VEDirectReplay
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+@pytest.fixture(params=["numpy", "adler32"])
+def summing(request):
+    """Run each test with numpy's batch sums (if installed) and the pure Python ones"""
+    def open_replay(source, **kwargs):
+        replay = VEDirectReplay(source, **kwargs)
+        if request.param == "adler32":
+            replay._array = None
+        return replay
+    return open_replay
+
+
+def test_replay_capture_file(tmp_path, summing):
+    emu = VEDirectDeviceEmulator("", model="ALL")
+    data = b"".join(emu.get_bytes() for _ in range(50))
+    path = tmp_path / "capture.bin"
+    path.write_bytes(b"V\t12800\r\nChecksum\tB" + data)  # Capture started mid-record
+    expected = list(VEDirectBase().feed(data))
+    with summing(str(path)) as replay:
+        assert list(replay.records()) == expected
+        assert replay.stats()["checksum_errors"] == 1
+        spans = list(replay.offsets())
+        assert len(spans) == 50 and spans[-1][1] == len(replay)
+        assert replay.decode(*spans[3]) == expected[3]
+
+
+def test_replay_damage_and_hex(summing):
+    emu = VEDirectDeviceEmulator("", model="BMV_700")
+    good = emu.get_bytes()
+    record = emu.get_record()
+    flipped = bytearray(good)
+    flipped[20] ^= 0x04
+    merged = good[:good.index(b"\r\nChecksum")]  # Block end lost: salvaged from the next PID
+    mark = good.index(b"\r\nV\t")
+    with_hex = good[:mark] + b":A0102000543\n" + good[mark:]
+    replay = summing(good + bytes(flipped) + merged + good + with_hex)
+    records = list(replay.records())
+    assert records == [record, record, record]
+    stats = replay.stats()
+    assert stats["checksum_errors"] == 1 and stats["resyncs"] == 1
+    assert list(VEDirectReplay(good, compact=True).records())[0] == VEDirectBase.typecast(record)
+
+
+def test_replay_empty_file(tmp_path):
+    path = tmp_path / "empty.bin"
+    path.write_bytes(b"")
+    with VEDirectReplay(str(path)) as replay:
+        assert list(replay.records()) == []
@@ -0,0 +1,51 @@
+import random
+
+from vedirect.vedirect_rolling import VEDirectRollingStats
+
+
+def brute(samples, now, span_ms, bucket_ms):
+    # What the bucketed window covers: the current bucket and the n - 1 before it
+    first = (now // bucket_ms - span_ms // bucket_ms + 1) * bucket_ms
+    values = [v for t, v in samples if first <= t <= now]
+    if not values:
+        return None
+    return {"min": min(values), "max": max(values), "mean": sum(values) / len(values), "count": len(values)}
+
+
+def test_windows_match_a_rescan():
+    rng = random.Random(7)
+    stats = VEDirectRollingStats(keys=("V", "PPV"), windows=(60, 900), buckets=30)
+    samples = []
+    now = 0
+    for i in range(5000):
+        # Mostly 1 Hz, with the odd long gap
+        if i:
+            now += rng.choice((1000, 1000, 1000, 250, 70000 if i % 997 == 0 else 1000))
+        record = {"V": rng.randrange(11000, 14000)}
+        if rng.random() < 0.7:
+            record["PPV"] = rng.randrange(0, 400)
+        stats.add(record, now)
+        samples.append((now, record))
+        if i % 50 == 0:
+            for window in (60, 900):
+                for key in ("V", "PPV"):
+                    got = stats.get(key, window, now)
+                    want = brute([(t, r[key]) for t, r in samples if key in r], now, window * 1000, window * 1000 // 30)
+                    if want is None:
+                        assert got is None
+                        continue
+                    assert got["count"] == want["count"]
+                    assert got["min"] == want["min"] and got["max"] == want["max"]
+                    assert abs(got["mean"] - want["mean"]) < 1e-3 * abs(want["mean"]) + 1e-3
+
+
+def test_snapshot_and_expiry():
+    stats = VEDirectRollingStats(keys=("V", "I"), windows=(60, 3600))
+    stats.add({"V": 12000, "I": -500}, now=0)
+    stats.add({"V": 13000}, now=1000)
+    snap = stats.snapshot(now=1000)
+    assert snap["V"][60] == {"min": 12000, "max": 13000, "mean": 12500, "count": 2, "last": 13000}
+    assert snap["I"][3600]["last"] == -500
+    # Two minutes on, the 1 minute window is empty but the hour still holds both
+    assert stats.get("V", 60, now=121000) is None
+    assert stats.get("V", 3600, now=121000)["count"] == 2
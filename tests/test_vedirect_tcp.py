@@ -0,0 +1,105 @@
+import asyncio
+import socket
+import threading
+
+from vedirect import VEDirect
+from vedirect.vedirect_tcp import TCPPort, VEDirectTCPPool
+from vedirect_device_emulator import VEDirectDeviceEmulator
+
+
+class BridgeServer:
+    """ser2net stand-in: sends each connection the stream in small pieces, then hangs up"""
+
+    def __init__(self, data, chunk=40):
+        self.data = data
+        self.chunk = chunk
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(4)
+        self.port = self.sock.getsockname()[1]
+        self.accepted = 0
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.accepted += 1
+            for i in range(0, len(self.data), self.chunk):
+                conn.sendall(self.data[i:i + self.chunk])
+            conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+def test_blocking_reconnects_after_bridge_hangs_up():
+    emu = VEDirectDeviceEmulator("", model="BMV_700")
+    server = BridgeServer(emu.get_bytes())
+    try:
+        port = TCPPort("127.0.0.1", server.port, timeout=1.0, retry_min=20)
+        ve = VEDirect(port)
+        expected = VEDirect.typecast(emu.get_record())
+        assert ve.read_data_single(flush=False, timeout=2000) == expected
+        # The bridge hung up after one record; the next one comes over a new connection
+        assert ve.read_data_single(flush=False, timeout=2000) == expected
+        health = port.health()
+        assert health["connects"] == 2 and health["disconnects"] >= 1
+        assert health["bytes_in"] == 2 * len(emu.get_bytes())
+    finally:
+        server.close()
+
+
+def test_blocking_url_and_refused_connection():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    free = sock.getsockname()[1]
+    sock.close()
+    ve = VEDirect("tcp://127.0.0.1:%d" % free, timeout=0.1)
+    assert ve.read_data_single(timeout=300) is None
+    health = ve.ser.health()
+    assert not health["connected"] and health["failures"] >= 1 and health["last_error"]
+    assert health["retry_ms"] > ve.ser.retry_min
+
+
+def test_pool_reads_many_bridges():
+    models = {"mppt": "MPPT", "bmv": "BMV_700", "inverter": "PHX_INVERTER"}
+    emus = {name: VEDirectDeviceEmulator("", model=model) for name, model in models.items()}
+
+    async def run():
+        async def serve(data, reader, writer):
+            for _ in range(3):
+                writer.write(data)
+                await writer.drain()
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(10)
+
+        servers = {}
+        for name, emu in emus.items():
+            data = emu.get_bytes()
+            servers[name] = await asyncio.start_server(
+                lambda r, w, data=data: serve(data, r, w), "127.0.0.1", 0)
+        bridges = {name: ("127.0.0.1", server.sockets[0].getsockname()[1]) for name, server in servers.items()}
+        bridges["down"] = "tcp://127.0.0.1:1"
+        seen = []
+        pool = VEDirectTCPPool(bridges, callback=lambda *tagged: seen.append(tagged), queue=16, retry_min=20)
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if len(seen) == 9:
+                break
+        stats = pool.stats()
+        for task in pool._run:
+            task.cancel()
+        for server in servers.values():
+            server.close()
+        return seen, stats
+
+    seen, stats = asyncio.run(run())
+    assert sorted(tagged[0] for tagged in seen) == sorted(list(models) * 3)
+    for name, pid, serial, record in seen:
+        assert record == emus[name].get_record()
+        assert pid == record["PID"]
+    assert stats["bmv"]["link"]["connected"] and stats["bmv"]["records"] == 3
+    assert stats["down"]["link"]["failures"] >= 1 and not stats["down"]["link"]["connected"]
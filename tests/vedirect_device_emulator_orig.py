@@ -15,7 +15,7 @@
 #
 # 2020 JMF
 
-import os, time, argparse
+import os, time, argparse, random
 import logging
 
 try:
@@ -189,16 +189,20 @@ class VEDirectDeviceEmulator:
         },
     }
 
-    def __init__(self, serialport, model="ALL"):
+    def __init__(self, serialport, model="ALL", errors=0.0, seed=None):
         """
         Constructor for Victron VEDirect device emulator.
 
         Args:
             serialport (str, int): Port to write to (or an integer file descriptor for testing)
             model (str): one of ['ALL', 'BMV_600', 'BMV_700', 'MPPT', 'PHX_INVERTER']
+            errors (float): probability that a record is damaged on the way out
+            seed (int): seed for the error injection, for repeatable runs
         """
         self.serialport = serialport
         self.model = model
+        self.errors = errors
+        self.rng = random.Random(seed)
         if MICROPYTHON:
             # Serial port is a UART
             self.ser = serialport
@@ -245,7 +249,21 @@ class VEDirectDeviceEmulator:
         return self.data[self.model]
 
     def get_bytes(self):
-        return bytes(self.record_to_bytes(self.get_record()))
+        result = self.record_to_bytes(self.get_record())
+        if self.errors and self.rng.random() < self.errors:
+            self.inject_error(result)
+        return bytes(result)
+
+    def inject_error(self, result):
+        """Damage a record in place the way a noisy line does: flip, drop or insert a byte"""
+        i = self.rng.randrange(len(result))
+        kind = self.rng.randrange(3)
+        if kind == 0:
+            result[i] ^= 1 << self.rng.randrange(8)
+        elif kind == 1:
+            del result[i]
+        else:
+            result.insert(i, self.rng.randrange(256))
 
     def send_records(self, n=-1, samples_per_hour=720.0):
         """Send n records"""
@@ -276,6 +294,9 @@ def main():
         default=model_default,
         type=str,
     )
+    parser.add_argument(
+        "--errors", default=0.0, help="fraction of records to damage (default=0)", type=float
+    )
     args = parser.parse_args()
     fd = None
     output = None
@@ -301,7 +322,7 @@ def main():
         destination = f"<stdout>"
         
     print(f"VEDirect emulator running. Writing to {destination}")
-    VEDirectDeviceEmulator(output, model=args.model).send_records(
+    VEDirectDeviceEmulator(output, model=args.model, errors=args.errors).send_records(
         n=args.n, samples_per_hour=args.sph
         )
         